@@ -1,4 +1,5 @@
 from lss import LssPacket, LssBus
+from lss.capacity import LssBusCapacity
 import math
 import time
 
@@ -23,6 +24,10 @@ if __name__ == '__main__':
     baud = 921600
     bus = LssBus('/dev/ttyUSB0', baud, low_latency=True)  # open serial port
 
+    # what the bus should manage for the D, C and S queries of each loop
+    capacity = LssBusCapacity(baud)
+    predicted_freq = capacity.max_cycle_rate([0], ['D', 'C', 'S'])
+
     #bus.write('#0Q3')  # write a string
     #p = bus.read()
     #print('isr: ', p.decode('utf-8'))
@@ -62,8 +67,9 @@ if __name__ == '__main__':
             progress_str = make_progress_bar(percent, 25)
             elapsed = time.time() - start_time
             avg_loop_freq = n / elapsed
-            print("  Packets {:6} {}  {:3}%  {}E  {:3}Hz".format(
-                n, progress_str, round(percent*100), errors, round(avg_loop_freq)
+            print("  Packets {:6} {}  {:3}%  {}E  {:3}Hz  (model {:3}Hz, {:3}%)".format(
+                n, progress_str, round(percent*100), errors, round(avg_loop_freq),
+                round(predicted_freq), round(avg_loop_freq / predicted_freq * 100)
             ), end='\r')
 
     #bus.write('#0Q3')  # write a string
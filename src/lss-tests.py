@@ -1,29 +1,11 @@
-from lss import LssPacket, LssBus
+from lss import LssPacket
+from lss.settings import CONFIG_FILE, config_search_path, find_config_file, load_settings
 import math
-import os
 import re
 import time
-import yaml
 import unittest
 import datetime
 
-port_name = 'COM4'
-baud = 921600
-low_latency = False
-servos = [0]
-
-def find_config_file(config_basefile: str):
-    config_path_search = ['~', '~/etc', '/etc/config', '.']
-    if os.getenv('APPDATA'):
-        config_path_search.append(os.getenv('APPDATA')+'/lynxmotion')
-    for path_prefix in config_path_search:
-        config_file = os.path.expanduser(os.path.join(path_prefix, config_basefile))
-        if os.path.isfile(config_file):
-            print('using config at ' + config_file)
-            return config_file
-    print(f'Cannot find {config_basefile} in paths  ' + '  '.join(config_path_search))
-    exit(-2)
-
 
 #
 # Loads test configuration from a yaml file
@@ -37,31 +19,21 @@ def find_config_file(config_basefile: str):
 # Windows:
 #    %APPDATA%/lynxmotion/lss-testing.yml   (user application data dir)
 #
-config = yaml.safe_load(
-    open(find_config_file('lss-testing.yml')))
-if config:
-    # load port details
-    if 'port' in config:
-        port = config['port']
-        port_name = port['name'] if 'name' in port else '/dev/ttyUSB0'
-        baud = port['baud'] if 'baud' in port else 921600
-        low_latency = port['low_latency'] if 'low_latency' in port else False
-
-    # load servo profiles
-    servos = config['servos'] if 'servos' in config else [0]
+config_file = find_config_file(CONFIG_FILE)
+if config_file is None:
+    print(f'Cannot find {CONFIG_FILE} in paths  ' + '  '.join(config_search_path()))
+    exit(-2)
+print('using config at ' + config_file)
+settings = load_settings(config_file)
+baud = settings.baud
 
 # now open the LSS bus
-bus = LssBus(
-    port_name,
-    baud,
-    low_latency=low_latency)
+bus = settings.open_bus()
 
 
 def get_servos(category: str):
-    return servos[category] \
-        if category in servos \
-        else servos['default']
-    
+    return settings.get_servos(category)
+
 
 #
 #  UNIT TESTS
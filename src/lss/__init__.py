@@ -1,7 +1,6 @@
+import math
 import re
-import unittest
 import array
-import serial
 
 
 REQUEST = '#'
@@ -74,7 +73,92 @@ LssCommandModifier = {
     'CL': 'Current Limp'
 }
 
+class LssUnit(object):
+    # how the raw integer value of a command maps to SI units: si = raw * scale + offset
+
+    unit: str
+    scale: float
+    offset: float
+    signed: bool
+    minimum: int or None
+    maximum: int or None
+
+    def __init__(self, unit: str, scale: float = 1.0, signed: bool = True, minimum: int = None, maximum: int = None,
+                 offset: float = 0.0):
+        self.unit = unit
+        self.scale = scale
+        self.offset = offset
+        self.signed = signed
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def to_si(self, value: int):
+        return value * self.scale + self.offset
+
+    def from_si(self, value: float):
+        return int(round((value - self.offset) / self.scale))
+
+    def valid(self, value: int):
+        if not self.signed and value < 0:
+            return False
+        return (self.minimum is None or value >= self.minimum) and (self.maximum is None or value <= self.maximum)
+
+
+TENTH_DEGREE = math.pi / 1800
+DEGREE = math.pi / 180
+RPM = 2 * math.pi / 60
+ZERO_CELSIUS = 273.15
+
+LssCommandUnits = {
+    'B': LssUnit('Bd', 1, False, 9600, 3000000),
+    'D': LssUnit('rad', TENTH_DEGREE),
+    'DT': LssUnit('rad', TENTH_DEGREE),
+    'MD': LssUnit('rad', TENTH_DEGREE),
+    'WD': LssUnit('rad/s', DEGREE),
+    'VT': LssUnit('rad/s', DEGREE),
+    'WR': LssUnit('rad/s', RPM),
+    'P': LssUnit('s', 1e-6, False, 500, 2500),
+    'M': LssUnit('s', 1e-6),
+    'RDM': LssUnit('', 1 / 1023, True, -1023, 1023),
+    'FPC': LssUnit('', 1, False, 1, 15),
+    'O': LssUnit('rad', TENTH_DEGREE),
+    'AR': LssUnit('rad', TENTH_DEGREE, False),
+    'AS': LssUnit('', 1, True, -10, 10),
+    'AH': LssUnit('', 1, True, -10, 10),
+    'AA': LssUnit('rad/s^2', 10 * DEGREE, False, 1, 100),
+    'AD': LssUnit('rad/s^2', 10 * DEGREE, False, 1, 100),
+    'G': LssUnit('', 1, True, -1, 1),
+    'FD': LssUnit('rad', TENTH_DEGREE),
+    'MMD': LssUnit('', 1 / 1023, False, 255, 1023),
+    'S': LssUnit('rad/s', TENTH_DEGREE),
+    'SD': LssUnit('rad/s', TENTH_DEGREE, False),
+    'SD2': LssUnit('rad/s', TENTH_DEGREE, False),
+    'SR': LssUnit('rad/s', RPM, False),
+    'SR2': LssUnit('rad/s', RPM, False),
+    'V': LssUnit('V', 0.001, False, 0, 14000),
+    'T': LssUnit('K', 0.1, True, -400, 1000, ZERO_CELSIUS),
+    'C': LssUnit('A', 0.001, False, 0, 10000),
+    'LED': LssUnit('', 1, False, 0, 7),
+    'LB': LssUnit('', 1, False, 0, 63),
+    'HD': LssUnit('rad', TENTH_DEGREE, False),
+    'LN': LssUnit('rad', TENTH_DEGREE),
+    'LP': LssUnit('rad', TENTH_DEGREE)
+}
+
 packet_re = re.compile('(#|\\*)(\\d+)(Q|C)?([a-z]*)([0-9-]+)?([a-z0-9\\-.]*)?', re.IGNORECASE)
+modifier_re = re.compile('({})(-?\\d+)'.format('|'.join(sorted(LssCommandModifier, key=len, reverse=True))),
+                         re.IGNORECASE)
+modifiers_re = re.compile('(?:{})+'.format(modifier_re.pattern), re.IGNORECASE)
+
+# commands whose query reply carries a string that runs on after the command
+# letters, such as *1QMSLSS-ST1
+LssStringCommands = ('MS', 'F', 'N')
+
+
+def reply_answers(letters: str, command: str):
+    # whether a query reply with the command letters `letters` answers a query of
+    # `command`, both upper case and '' for the status query
+    return letters == command or (command in LssStringCommands and letters.startswith(command))
 
 
 class LssException(Exception):
@@ -91,6 +175,7 @@ class LssPacket(object):
     command: str
     description: str
     value: int or float or str
+    modifiers: dict
 
     known: bool
 
@@ -105,6 +190,7 @@ class LssPacket(object):
             self.kind = m[3] if m[3] is not None else ACTION
             self.command = m[4]
             self.value = None
+            self.modifiers = {}
             extra = m[6]
             if self.kind == QUERY and self.command == '':
                 # the lonely Q command for query status
@@ -131,6 +217,10 @@ class LssPacket(object):
                     elif extra is not None:
                         # garbage value after command
                         raise LssException('Garbled packet value')
+                elif self.direction == REQUEST and modifiers_re.fullmatch(extra):
+                    # move modifiers such as T (timed move) or SD (speed) follow the value
+                    for name, value in modifier_re.findall(extra):
+                        self.modifiers[name.upper()] = int(value)
                 else:
                     self.value = None
 
@@ -143,15 +233,35 @@ class LssPacket(object):
         else:
             raise LssException('Invalid packet')
 
+    @property
+    def unit(self):
+        return LssCommandUnits.get(self.command)
+
+    @property
+    def si_value(self):
+        # the value in SI units, None when the command has no unit or no numeric value
+        unit = LssCommandUnits.get(self.command)
+        if unit is None or not isinstance(self.value, int):
+            return None
+        return unit.to_si(self.value)
+
 
 
 class LssBus(object):
     def __init__(self, port, baud, low_latency=True):
-        self.ser = serial.Serial(port, baud, timeout=1)  # open serial port
-        if low_latency:
-            self.set_low_latency(True, True)
+        if isinstance(port, str):
+            # imported here so tools that never open a port don't pay for pyserial
+            import serial
+            self.ser = serial.Serial(port, baud, timeout=1)  # open serial port
+        else:
+            # an already open port, or anything with the same read/write interface
+            self.ser = port
         self.eol = b'\r'
         self.revert_low_latency = False
+        if low_latency:
+            self.set_low_latency(True, True)
+        self.listeners = []
+        self.recorder = None
 
     def baudrate(self, baudrate: int):
         self.ser.baudrate = baudrate
@@ -194,11 +304,27 @@ class LssBus(object):
         if not isinstance(packet, str):
             packet = str(packet)
         data = packet.encode('utf8') + self.eol
-        self.ser.write(data)
+        self.write_raw(data)
 
     def write_command(self, id, command: str):
         data = f'#{id}{command}'.encode('utf8') + self.eol
+        self.write_raw(data)
+
+    def write_packets(self, packets):
+        # writes all packets in a single serial write so they go out back to back
+        data = b''.join((p if isinstance(p, str) else str(p)).encode('utf8') + self.eol for p in packets)
+        self.write_raw(data)
+
+    def write_commands(self, commands):
+        # commands is an iterable of (id, command) pairs
+        data = b''.join(f'#{id}{command}'.encode('utf8') + self.eol for id, command in commands)
+        self.write_raw(data)
+
+    def write_raw(self, data: bytes):
+        # data is one or more complete frames including their eol
         self.ser.write(data)
+        if self.recorder:
+            self.recorder.record_write(data)
 
     def read_raw(self):
         leneol = len(self.eol)
@@ -212,46 +338,24 @@ class LssBus(object):
                     break
             else:
                 break
-        return bytes(line)
+        line = bytes(line)
+        if self.recorder and line:
+            self.recorder.record_read(line)
+        return line
+
+    def add_listener(self, listener):
+        # listeners are called with every packet returned by read()
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
 
     def read(self):
         raw = self.read_raw()
         if raw:
-            return LssPacket(raw.decode())
+            packet = LssPacket(raw.decode())
+            for listener in self.listeners:
+                listener(packet)
+            return packet
         else:
             raise TimeoutError("no data available")
-
-class LssPacketTests(unittest.TestCase):
-    def assert_packet(self, p: LssPacket):
-        self.assertIsNotNone(p)
-        self.assertGreater(p.id, 0)
-        self.assertLess(p.id, 50)
-        self.assertIn(p.direction, [REQUEST, REPLY])
-        self.assertIn(p.kind, [ACTION, QUERY, CONFIG])
-        self.assertTrue(p.known)
-
-    def test_command_position(self):
-        self.assert_packet(LssPacket('#12D521'))
-
-    def test_reply_model(self):
-        p = LssPacket('*12QMSLSS-HT1')
-        self.assert_packet(p)
-        self.assertEqual(p.value, 'LSS-HT1')
-
-    def test_reply_position(self):
-        p = LssPacket('*12QD980')
-        self.assert_packet(p)
-        self.assertEqual(p.value, 980)
-
-    def test_reply_neg_position(self):
-        p = LssPacket('*19QD-1190')
-        self.assert_packet(p)
-        self.assertEqual(p.value, -1190)
-
-    def test_reply_QS0(self):
-        p = LssPacket('*19QS900')
-        self.assert_packet(p)
-        self.assertEqual(p.value, 900)
-
-if __name__ == '__main__':
-    unittest.main()
@@ -0,0 +1,5 @@
+import sys
+
+from lss.cli import main
+
+sys.exit(main())
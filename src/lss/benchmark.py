@@ -0,0 +1,492 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+from lss import LssBus, LssPacket
+
+
+# Benchmarks of the hot paths of the library, run without hardware:
+#
+#   micro   packet parsing, command encoding and frame splitting against in-memory ports
+#   macro   full round trips through LssBus against the pty emulator
+#
+# Every benchmark reports the time of one operation as percentiles over many
+# rounds. Each round is paired with a round of a plain Python calibration loop and
+# the median ratio of the two is reported as well. Baselines are compared on that
+# ratio, which cancels out the speed of the machine and its frequency drift, so a
+# baseline taken on one machine can gate runs on another.
+
+BENCHMARK_VERSION = 1
+
+# the checked-in baseline ships inside the package, so the gate works from any directory
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# a hot path regresses when its relative median grows by more than this fraction
+DEFAULT_THRESHOLD = 0.25
+
+PERCENTILES = (50, 90, 99)
+
+# runs of every benchmark, the median run is reported
+DEFAULT_REPEAT = 5
+
+# iterations of the calibration loop paired with every round
+CALIBRATION_NUMBER = 2000
+
+
+class LssNullPort(object):
+    # a port that accepts and discards everything written to it
+
+    def write(self, data: bytes):
+        return len(data)
+
+    def read(self, size: int = 1):
+        return b''
+
+    def close(self):
+        pass
+
+
+class LssLoopbackPort(object):
+    # a port whose reads return the given frames over and over
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.buffer = io.BytesIO(data)
+
+    def write(self, data: bytes):
+        return len(data)
+
+    def read(self, size: int = 1):
+        c = self.buffer.read(size)
+        if not c:
+            self.buffer.seek(0)
+            c = self.buffer.read(size)
+        return c
+
+    def close(self):
+        pass
+
+
+class LssBenchmark(object):
+    # setup(number) returns the operation to time, a callable doing `number`
+    # operations per call; teardown() releases whatever setup() opened
+
+    name: str
+    kind: str
+    number: int
+    rounds: int
+
+    def __init__(self, name: str, kind: str, setup, number: int, rounds: int, teardown=None):
+        self.name = name
+        self.kind = kind
+        self.setup = setup
+        self.teardown = teardown
+        self.number = number
+        self.rounds = rounds
+
+
+class LssBenchmarkResult(object):
+
+    name: str
+    kind: str
+    rounds: int
+    number: int
+    percentiles: dict
+    mean: float
+    relative: float or None
+
+    def __init__(self, name: str, kind: str, times, number: int, calibration=None):
+        # times are seconds per operation, one per round, calibration the seconds per
+        # calibration loop iteration of the round paired with each
+        self.name = name
+        self.kind = kind
+        self.rounds = len(times)
+        self.number = number
+        self.relative = percentile(sorted(t / c for t, c in zip(times, calibration)), 50) if calibration else None
+        times = sorted(times)
+        self.percentiles = {p: percentile(times, p) for p in PERCENTILES}
+        self.mean = sum(times) / len(times)
+
+    @property
+    def median(self):
+        return self.percentiles[50]
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'rounds': self.rounds,
+            'number': self.number,
+            'mean': self.mean,
+            'percentiles': {f'p{p}': value for p, value in self.percentiles.items()},
+            'relative': self.relative
+        }
+
+    def __repr__(self):
+        return '{:28} {:6} p50 {:9.3f}us  p90 {:9.3f}us  p99 {:9.3f}us'.format(
+            self.name, self.kind, self.percentiles[50] * 1e6, self.percentiles[90] * 1e6, self.percentiles[99] * 1e6)
+
+
+class LssBenchmarkComparison(object):
+
+    name: str
+    baseline: float
+    current: float
+    ratio: float
+    regressed: bool
+
+    def __init__(self, name: str, baseline: float, current: float, threshold: float):
+        self.name = name
+        self.baseline = baseline
+        self.current = current
+        self.ratio = current / baseline if baseline > 0 else float('inf')
+        self.regressed = self.ratio > 1 + threshold
+
+    def __repr__(self):
+        return '{:28} {:+7.1f}%{}'.format(self.name, (self.ratio - 1) * 100, '  REGRESSED' if self.regressed else '')
+
+
+def percentile(sorted_values, p: float):
+    # linear interpolation between closest ranks, like numpy.percentile
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(operation, number: int, rounds: int, calibration=None, clock=time.perf_counter):
+    # returns the seconds per operation of each round, and with a calibration
+    # operation also the seconds per calibration iteration before each round
+    operation()     # warm up caches and lazy imports
+    times = []
+    calibration_times = []
+    for _ in range(rounds):
+        if calibration:
+            start = clock()
+            calibration()
+            calibration_times.append((clock() - start) / CALIBRATION_NUMBER)
+        start = clock()
+        operation()
+        times.append((clock() - start) / number)
+    return times, calibration_times
+
+
+def calibration_loop(number: int = CALIBRATION_NUMBER):
+    def operation():
+        total = 0
+        for i in range(number):
+            total += i * i
+        return total
+    return operation
+
+
+def parse_reply(number: int):
+    def operation():
+        for _ in range(number):
+            LssPacket('*1QD-1800')
+    return operation
+
+
+def parse_request(number: int):
+    def operation():
+        for _ in range(number):
+            LssPacket('#1D900T500SD300')
+    return operation
+
+
+def parse_string_reply(number: int):
+    def operation():
+        for _ in range(number):
+            LssPacket('*1QMSLSS-ST1')
+    return operation
+
+
+def encode_command(number: int):
+    bus = LssBus(LssNullPort(), 921600, low_latency=False)
+
+    def operation():
+        for _ in range(number):
+            bus.write_command(1, 'D900')
+    return operation
+
+
+def encode_commands(number: int):
+    bus = LssBus(LssNullPort(), 921600, low_latency=False)
+    commands = [(servo, 'QD') for servo in range(1, 7)]
+
+    def operation():
+        for _ in range(number):
+            bus.write_commands(commands)
+    return operation
+
+
+def split_frames(number: int):
+    bus = LssBus(LssLoopbackPort(b'*1QD-1800\r*1QV11900\r*1QC120\r'), 921600, low_latency=False)
+
+    def operation():
+        for _ in range(number):
+            bus.read_raw()
+    return operation
+
+
+def read_packets(number: int):
+    bus = LssBus(LssLoopbackPort(b'*1QD-1800\r*1QV11900\r*1QC120\r'), 921600, low_latency=False)
+
+    def operation():
+        for _ in range(number):
+            bus.read()
+    return operation
+
+
+class EmulatedRoundTrip(object):
+    # setup/teardown for round trips through a pty emulator
+
+    def __init__(self, burst: int = 1):
+        self.burst = burst
+        self.emulator = None
+        self.bus = None
+
+    def setup(self, number: int):
+        from lss.emulator import LssEmulator
+        self.emulator = LssEmulator(range(1, self.burst + 1))
+        self.emulator.start()
+        self.bus = LssBus(self.emulator.port, 921600, low_latency=False)
+        commands = [(servo, 'QD') for servo in range(1, self.burst + 1)]
+        bus = self.bus
+
+        def operation():
+            for _ in range(number):
+                bus.write_commands(commands)
+                for _ in commands:
+                    bus.read()
+        return operation
+
+    def teardown(self):
+        self.bus.close()
+        self.emulator.stop()
+
+
+def make_benchmarks(scale: float = 1.0):
+    # scale shrinks or grows the work per benchmark, e.g. 0.1 for a quick check
+    def count(n):
+        return max(1, int(n * scale))
+
+    micro = 'micro'
+    benchmarks = [
+        LssBenchmark('parse_reply', micro, parse_reply, 200, count(200)),
+        LssBenchmark('parse_request_modifiers', micro, parse_request, 200, count(200)),
+        LssBenchmark('parse_string_reply', micro, parse_string_reply, 200, count(200)),
+        LssBenchmark('write_command', micro, encode_command, 500, count(200)),
+        LssBenchmark('write_commands_6', micro, encode_commands, 200, count(200)),
+        LssBenchmark('read_raw', micro, split_frames, 200, count(200)),
+        LssBenchmark('read', micro, read_packets, 200, count(200)),
+    ]
+    for burst in (1, 3, 6):
+        round_trip = EmulatedRoundTrip(burst)
+        benchmarks.append(LssBenchmark(f'round_trip_{burst}', 'macro', round_trip.setup, 1, count(1000),
+                                       teardown=round_trip.teardown))
+    return benchmarks
+
+
+# the bus model is checked at this baud, slow enough that wire time dominates a burst
+MODEL_BAUD = 115200
+
+# how much faster than measured the model may predict a cycle before it counts as
+# optimistic, i.e. before admit() would accept schedules the bus can't keep up with
+MODEL_TOLERANCE = 0.1
+
+
+def model_check(baud: int = MODEL_BAUD, bursts=(1, 6), cycles: int = 100):
+    # Compares LssBusCapacity as shipped, at baud with its default turnaround and host
+    # latency, with cycles of QD polls measured through the emulator paced at the
+    # same baud, both written as one burst and one round trip at a time. The emulator
+    # stands in for the servos and the wire, so this checks how the model adds up a
+    # cycle and that its host latency, sized for a USB adapter, keeps it on the safe
+    # side of the pty's; its wire times can only be checked on hardware, with
+    # `lss bench` or lss-stress-test.py. An error above MODEL_TOLERANCE means the
+    # model is optimistic.
+    from lss.capacity import LssBusCapacity, DEFAULT_TURNAROUND
+    from lss.emulator import LssEmulator
+    capacity = LssBusCapacity(baud)
+    results = {}
+    for burst in bursts:
+        servos = range(1, burst + 1)
+        commands = [(servo, 'QD') for servo in servos]
+        with LssEmulator(servos, baud=baud, turnaround=DEFAULT_TURNAROUND) as emulator:
+            bus = LssBus(emulator.port, baud, low_latency=False)
+            try:
+                for pipelined in (True, False):
+                    batches = [commands] if pipelined else [[command] for command in commands]
+                    start = time.perf_counter()
+                    for _ in range(cycles):
+                        for batch in batches:
+                            bus.write_commands(batch)
+                            for _ in batch:
+                                bus.read()
+                    measured = (time.perf_counter() - start) / cycles
+                    predicted = capacity.cycle_time(servos, ['D'], pipelined)
+                    results[f'{"pipelined" if pipelined else "sequential"}_{burst}'] = {
+                        'predicted': predicted, 'measured': measured, 'error': measured / predicted - 1}
+            finally:
+                bus.close()
+    return {'baud': baud, 'cycles': results,
+            'optimistic': sorted(name for name, r in results.items() if r['error'] > MODEL_TOLERANCE)}
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count()
+    }
+    try:
+        import serial
+        info['pyserial'] = serial.VERSION
+    except ImportError:
+        info['pyserial'] = None
+    return info
+
+
+def run(benchmarks=None, scale: float = 1.0, select=None, repeat: int = DEFAULT_REPEAT, log=None):
+    # runs the benchmarks and returns the report as a json serialisable dict. All
+    # benchmarks are run in turn `repeat` times, so a burst of background load hits
+    # one run of a benchmark rather than all of them, and the run with the median
+    # relative median is kept. Load can slow down the calibration rounds as well as
+    # the benchmark, so a run comes out too fast as easily as too slow and the
+    # fastest run is as much an outlier as the slowest.
+    if benchmarks is None:
+        benchmarks = make_benchmarks(scale)
+    benchmarks = [benchmark for benchmark in benchmarks if not select or benchmark.name in select]
+    calibration = calibration_loop()
+    attempts = {benchmark.name: [] for benchmark in benchmarks}
+    for _ in range(max(1, repeat)):
+        for benchmark in benchmarks:
+            operation = benchmark.setup(benchmark.number)
+            try:
+                times, calibration_times = measure(operation, benchmark.number, benchmark.rounds, calibration)
+            finally:
+                if benchmark.teardown:
+                    benchmark.teardown()
+            attempts[benchmark.name].append(LssBenchmarkResult(
+                benchmark.name, benchmark.kind, times, benchmark.number, calibration_times))
+    results = {}
+    for benchmark in benchmarks:
+        runs = sorted(attempts[benchmark.name], key=lambda attempt: attempt.relative)
+        result = runs[len(runs) // 2]
+        if log:
+            log(repr(result))
+        results[benchmark.name] = result.to_dict()
+    report = {
+        'version': BENCHMARK_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': environment(),
+        'benchmarks': results
+    }
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD):
+    # compares the relative medians of the benchmarks both reports share
+    comparisons = []
+    for name, current in report['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        previous = baseline['benchmarks'][name]
+        if current.get('relative') and previous.get('relative'):
+            comparisons.append(LssBenchmarkComparison(name, previous['relative'], current['relative'], threshold))
+        else:
+            comparisons.append(LssBenchmarkComparison(
+                name, previous['percentiles']['p50'], current['percentiles']['p50'], threshold))
+    return comparisons
+
+
+def merge_reports(reports):
+    # one report from several, each benchmark taken from the report with its median
+    # relative median, for baselines that don't hinge on the state of one process
+    merged = dict(reports[-1], benchmarks={})
+    for name in reports[-1]['benchmarks']:
+        entries = sorted((report['benchmarks'][name] for report in reports if name in report['benchmarks']),
+                         key=lambda entry: entry.get('relative') or entry['percentiles']['p50'])
+        merged['benchmarks'][name] = entries[len(entries) // 2]
+    return merged
+
+
+def load_report(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report: dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='lss-benchmark', description='benchmark the lss hot paths')
+    parser.add_argument('--output', '-o', help='write the json report to this file, - for stdout')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='report to compare against, default the baseline in the lss package')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help='succeed when there is no baseline instead of failing')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown of a median as a fraction, default %(default)s')
+    parser.add_argument('--save-baseline', action='store_true', help='write the report as the new baseline')
+    parser.add_argument('--scale', type=float, default=1.0, help='work per benchmark, e.g. 0.1 for a quick run')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='runs of every benchmark, the median counts, default %(default)s')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='only run these benchmarks')
+    parser.add_argument('--merge', nargs='+', metavar='REPORT',
+                        help='use the median of these json reports instead of running the benchmarks')
+    parser.add_argument('--check-model', action='store_true',
+                        help='also compare the bus capacity model with cycles measured on the emulator')
+    args = parser.parse_args(argv)
+
+    log = (lambda line: print(line, file=sys.stderr)) if args.output == '-' else print
+    if args.merge:
+        report = merge_reports([load_report(path) for path in args.merge])
+    else:
+        report = run(scale=args.scale, select=args.only, repeat=args.repeat, log=log)
+    if args.check_model:
+        report['model'] = model_check(cycles=max(1, int(100 * args.scale)))
+        for name, cycle in report['model']['cycles'].items():
+            log('model {:22} predicted {:9.1f}us  measured {:9.1f}us  {:+7.1f}%'.format(
+                name, cycle['predicted'] * 1e6, cycle['measured'] * 1e6, cycle['error'] * 100))
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif args.output:
+        save_report(report, args.output)
+    if args.save_baseline:
+        save_report(report, args.baseline)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        if args.allow_missing_baseline:
+            log(f'no baseline at {args.baseline}, nothing to compare')
+            return 0
+        log(f'error: no baseline at {args.baseline}')
+        return 2
+    regressions = 0
+    for comparison in compare(report, load_report(args.baseline), args.threshold):
+        log(repr(comparison))
+        regressions += comparison.regressed
+    if regressions:
+        log(f'{regressions} benchmark(s) regressed by more than {args.threshold * 100:.0f}%')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import math
+
+from lss import LssException, REQUEST, REPLY, QUERY, LssCommandDescription
+
+
+# 8N1 framing: start bit + 8 data bits + stop bit
+BITS_PER_BYTE = 10
+
+# time a servo takes between the end of a request frame and the start of its reply
+DEFAULT_TURNAROUND = 0.0001
+
+# time the host adds per round trip (USB polling, driver and interpreter latency),
+# about 1ms for an FTDI adapter with ASYNC_LOW_LATENCY set and 16ms without
+DEFAULT_HOST_LATENCY = 0.001
+
+# fraction of the bus a polling schedule may use by default
+DEFAULT_BUDGET = 0.8
+
+# typical number of characters in the value of each command, used to size
+# reply frames (and action frames when no value is given)
+LssTypicalValueWidth = {
+    'ID': 3,
+    'B': 6,
+    'D': 5,
+    'DT': 5,
+    'MD': 5,
+    'WD': 5,
+    'VT': 5,
+    'WR': 3,
+    'P': 4,
+    'M': 4,
+    'RDM': 5,
+    'Q': 1,
+    'L': 0,
+    'H': 0,
+    'EM': 1,
+    'FPC': 2,
+    'O': 5,
+    'AR': 4,
+    'AS': 2,
+    'AH': 2,
+    'AA': 3,
+    'AD': 3,
+    'G': 2,
+    'FD': 5,
+    'MMD': 4,
+    'S': 4,
+    'SD': 4,
+    'SD2': 4,
+    'SR': 3,
+    'SR2': 3,
+    'V': 5,
+    'T': 3,
+    'C': 4,
+    'LED': 1,
+    'LB': 2,
+    'MS': 7,
+    'F': 3,
+    'N': 8,
+    'HD': 2,
+    'LN': 5,
+    'LP': 4,
+    'LE': 1,
+    'CSL': 3,
+    'IPE': 1,
+    'PO': 1,
+    'IS': 1,
+    'RIS': 1,
+    'CR': 1,
+    'TQ': 4,
+    'TQT': 4,
+    'TQM': 4,
+    'Y': 1
+}
+
+DEFAULT_VALUE_WIDTH = 4
+
+
+def value_width(command: str, value=None):
+    if value is not None:
+        return len(str(value))
+    return LssTypicalValueWidth.get(command, DEFAULT_VALUE_WIDTH)
+
+
+class LssBusCapacity(object):
+    # Wire-time model of an LSS bus. Schedules are lists of (servo, command, rate_hz)
+    # tuples, each entry being a query polled at the given rate.
+
+    baud: int
+    turnaround: float
+    host_latency: float
+
+    def __init__(self, baud: int, turnaround: float = DEFAULT_TURNAROUND,
+                 host_latency: float = DEFAULT_HOST_LATENCY, eol: bytes = b'\r'):
+        if baud <= 0:
+            raise LssException('Baudrate must be positive')
+        self.baud = baud
+        self.turnaround = turnaround
+        self.host_latency = host_latency
+        self.eol = eol
+
+    def wire_time(self, nbytes: int):
+        return nbytes * BITS_PER_BYTE / self.baud
+
+    def request_length(self, servo: int, command: str, query: bool = True, value=None):
+        # #<id>Q<cmd> for queries, #<id><cmd><value> for actions and configs
+        if query:
+            return len(REQUEST) + len(str(servo)) + len(QUERY) + len(command) + len(self.eol)
+        return len(REQUEST) + len(str(servo)) + len(command) + value_width(command, value) + len(self.eol)
+
+    def reply_length(self, servo: int, command: str, value=None):
+        # *<id>Q<cmd><value>
+        return len(REPLY) + len(str(servo)) + len(QUERY) + len(command) + \
+            value_width(command, value) + len(self.eol)
+
+    def write_time(self, servo: int, command: str, value=None):
+        return self.wire_time(self.request_length(servo, command, False, value))
+
+    def query_time(self, servo: int, command: str, pipelined: bool = False):
+        # bus time of one query and its reply, plus the host round trip unless the
+        # query is pipelined behind others
+        t = self.wire_time(self.request_length(servo, command) + self.reply_length(servo, command)) \
+            + self.turnaround
+        return t if pipelined else t + self.host_latency
+
+    def cycle_time(self, servos, commands, pipelined: bool = False):
+        # time to query every command on every servo once, either one round trip at a
+        # time or written as a single burst and read back in order
+        t = sum(self.query_time(servo, command, True) for servo in servos for command in commands)
+        if pipelined:
+            return t + self.host_latency
+        return t + self.host_latency * len(servos) * len(commands)
+
+    def max_cycle_rate(self, servos, commands, pipelined: bool = False):
+        t = self.cycle_time(servos, commands, pipelined)
+        return 1.0 / t if t > 0 else math.inf
+
+    def utilisation(self, schedule, pipelined: bool = False):
+        # fraction of the bus the schedule needs. Polled one round trip at a time every
+        # query pays the host round trip; pipelined, as by LssDaemon batches or
+        # write_commands bursts, the queries due together share one, paid at the
+        # highest rate of the schedule
+        load = sum(rate * self.query_time(servo, command, pipelined) for servo, command, rate in schedule)
+        if pipelined and schedule:
+            load += max(rate for _, _, rate in schedule) * self.host_latency
+        return load
+
+    def admit(self, schedule, budget: float = DEFAULT_BUDGET, pipelined: bool = False):
+        for servo, command, rate in schedule:
+            if command not in LssCommandDescription:
+                raise LssException(f'Unknown command {command} in schedule')
+            if rate < 0:
+                raise LssException(f'Negative rate for {command} on servo {servo}')
+        load = self.utilisation(schedule, pipelined)
+        if load > budget:
+            raise LssException(
+                'Schedule needs {:.0%} of the bus at {} baud, budget is {:.0%}'.format(load, self.baud, budget))
+        return load
+
+    def rescale(self, schedule, budget: float = DEFAULT_BUDGET, pipelined: bool = False):
+        # scales all rates down by the same factor so the schedule fits the budget,
+        # schedules that already fit are returned unchanged
+        load = self.utilisation(schedule, pipelined)
+        if load <= budget:
+            return list(schedule)
+        scale = budget / load
+        return [(servo, command, rate * scale) for servo, command, rate in schedule]
@@ -0,0 +1,289 @@
+import bisect
+import mmap
+import os
+import re
+import struct
+import time
+from array import array
+
+from lss import LssException
+
+
+# A capture is two append-only files:
+#
+#   <path>          32 byte header followed by fixed-size records
+#   <path>.payload  the raw frames (without eol), back to back
+#
+# The header holds the time.time_ns() and time.monotonic_ns() of when the capture
+# was started. Each record holds:
+#
+#   timestamp   int64    ns since the epoch when the frame was written or read,
+#                        counted on the monotonic clock from the start of the
+#                        capture so records stay in order when the wall clock is
+#                        stepped (version 1 captures have plain time.time_ns())
+#   direction   uint8    CAPTURE_WRITE or CAPTURE_READ
+#   id          uint8    servo id
+#   length      uint16   payload length
+#   command     4 bytes  command letters including any Q/C prefix, truncated to 4
+#   value       int32    numeric value, NO_VALUE when the frame has none
+#   offset      uint64   payload offset
+CAPTURE_MAGIC = b'LSSCAP\0\0'
+CAPTURE_VERSION = 2
+
+header_struct = struct.Struct('<8sHH4xqq')
+header_v1_struct = struct.Struct('<8sHH4x')
+record_struct = struct.Struct('<qBBH4siQ')
+
+CAPTURE_WRITE = 0
+CAPTURE_READ = 1
+
+NO_VALUE = -0x80000000
+
+PAYLOAD_SUFFIX = '.payload'
+
+frame_re = re.compile(b'[#*](\\d+)([A-Za-z]*)(-?\\d+)?')
+
+
+class LssCaptureRecorder(object):
+    # Appends every frame an LssBus writes or reads to a capture:
+    #
+    #   bus.recorder = LssCaptureRecorder('run.lsscap')
+    #
+    # Records are packed into buffered files, so a frame costs a regex match, a
+    # struct pack and two buffered writes.
+
+    def __init__(self, path: str, eol: bytes = b'\r'):
+        self.path = path
+        self.eol = eol
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if new:
+            started, monotonic = time.time_ns(), time.monotonic_ns()
+            last = None
+        else:
+            with LssCaptureReader(path) as reader:
+                if reader.version != CAPTURE_VERSION:
+                    raise LssException(f'Can only append to version {CAPTURE_VERSION} captures, {path} is not one')
+                started, monotonic = reader.started, reader.started_monotonic
+                last = reader.timestamps[-1] if len(reader) else None
+        # maps the monotonic clock to the timeline of the capture
+        self.shift = started - monotonic
+        now = time.monotonic_ns()
+        if last is not None and now + self.shift < last:
+            # the monotonic clock restarted since the capture began, i.e. the machine
+            # rebooted; carry on from the wall clock or the last record, whichever is later
+            self.shift = max(time.time_ns(), last) - now
+        self.records = open(path, 'ab')
+        self.payload = open(path + PAYLOAD_SUFFIX, 'ab')
+        if new:
+            self.records.write(header_struct.pack(CAPTURE_MAGIC, CAPTURE_VERSION, record_struct.size,
+                                                  started, monotonic))
+        self.offset = self.payload.tell()
+
+    def now(self):
+        return time.monotonic_ns() + self.shift
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def record(self, direction: int, frame: bytes, timestamp: int = None):
+        m = frame_re.match(frame)
+        if m:
+            id = int(m[1]) & 0xff
+            command = m[2][:4]
+            value = int(m[3]) if m[3] and -0x80000000 < int(m[3]) < 0x80000000 else NO_VALUE
+        else:
+            id, command, value = 0, b'', NO_VALUE
+        self.records.write(record_struct.pack(
+            timestamp if timestamp is not None else self.now(),
+            direction, id, len(frame), command, value, self.offset))
+        self.payload.write(frame)
+        self.offset += len(frame)
+
+    def record_write(self, data: bytes):
+        # data may hold several frames, each terminated by eol
+        timestamp = self.now()
+        for frame in data.split(self.eol):
+            if frame:
+                self.record(CAPTURE_WRITE, frame, timestamp)
+
+    def record_read(self, frame: bytes):
+        self.record(CAPTURE_READ, frame)
+
+    def flush(self):
+        # payload first, so a reader never sees a record whose payload is missing
+        self.payload.flush()
+        self.records.flush()
+
+    def close(self):
+        self.flush()
+        self.records.close()
+        self.payload.close()
+
+
+class LssCaptureRecord(object):
+
+    timestamp: int
+    direction: int
+    id: int
+    command: str
+    value: int or None
+    payload: bytes
+
+    def __init__(self, values, payload: bytes):
+        self.timestamp, self.direction, self.id, _, command, value, _ = values
+        self.command = command.rstrip(b'\0').decode('ascii')
+        self.value = None if value == NO_VALUE else value
+        self.payload = payload
+
+    def __repr__(self):
+        return 'LssCaptureRecord({}, {}, {!r})'.format(
+            self.timestamp, 'write' if self.direction == CAPTURE_WRITE else 'read', self.payload)
+
+
+class LssCaptureReader(object):
+    # Memory-maps a capture for random access. The index (servo, command) -> record
+    # numbers and the timestamp column are built on first use.
+
+    version: int
+    started: int or None
+    started_monotonic: int or None
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records_file = open(path, 'rb')
+        self.payload_file = open(path + PAYLOAD_SUFFIX, 'rb')
+        self.records = mmap.mmap(self.records_file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = os.path.getsize(path + PAYLOAD_SUFFIX)
+        self.payload = mmap.mmap(self.payload_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        magic, version, record_size = header_v1_struct.unpack_from(self.records, 0)
+        if magic != CAPTURE_MAGIC or version not in (1, CAPTURE_VERSION) or record_size != record_struct.size:
+            raise LssException(f'{path} is not an LSS capture')
+        self.version = version
+        if version == 1:
+            self.header_size = header_v1_struct.size
+            self.started = self.started_monotonic = None
+        else:
+            self.header_size = header_struct.size
+            self.started, self.started_monotonic = header_struct.unpack_from(self.records, 0)[3:]
+        # a record still being written by the recorder is ignored
+        self.count = (len(self.records) - self.header_size) // record_struct.size
+        self._timestamps = None
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n: int):
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError(n)
+        values = record_struct.unpack_from(self.records, self.header_size + n * record_struct.size)
+        offset = values[6]
+        return LssCaptureRecord(values, bytes(self.payload[offset:offset + values[3]]))
+
+    def close(self):
+        self.records.close()
+        if isinstance(self.payload, mmap.mmap):
+            self.payload.close()
+        self.records_file.close()
+        self.payload_file.close()
+
+    @property
+    def timestamps(self):
+        if self._timestamps is None:
+            view = memoryview(self.records)[self.header_size:self.header_size + self.count * record_struct.size]
+            self._timestamps = array('q', (values[0] for values in record_struct.iter_unpack(view)))
+            view.release()
+        return self._timestamps
+
+    @property
+    def index(self):
+        if self._index is None:
+            index = {}
+            view = memoryview(self.records)[self.header_size:self.header_size + self.count * record_struct.size]
+            for n, values in enumerate(record_struct.iter_unpack(view)):
+                key = (values[2], values[4].rstrip(b'\0').decode('ascii'))
+                numbers = index.get(key)
+                if numbers is None:
+                    numbers = index[key] = array('l')
+                numbers.append(n)
+            view.release()
+            self._index = index
+        return self._index
+
+    def window(self, start: int = None, end: int = None):
+        # record numbers with start <= timestamp < end, timestamps in ns
+        timestamps = self.timestamps
+        first = bisect.bisect_left(timestamps, start) if start is not None else 0
+        last = bisect.bisect_left(timestamps, end) if end is not None else self.count
+        return range(first, last)
+
+    def select(self, servo: int = None, command: str = None, start: int = None, end: int = None):
+        # records matching a servo and/or command (as recorded, e.g. 'QD') within a time window
+        numbers = self.window(start, end)
+        if servo is not None or command is not None:
+            wanted = [key for key in self.index
+                      if (servo is None or key[0] == servo) and (command is None or key[1] == command)]
+            matches = sorted(n for key in wanted for n in self.index[key]
+                             if numbers.start <= n < numbers.stop)
+            numbers = matches
+        return [self[n] for n in numbers]
+
+    def replay(self, start: int = None, end: int = None, speed: float = 1.0):
+        # yields records of a time window with the original spacing divided by speed,
+        # a speed of 0 replays as fast as possible
+        origin = None
+        clock = time.perf_counter()
+        for n in self.window(start, end):
+            record = self[n]
+            if origin is None:
+                origin = record.timestamp
+            if speed > 0:
+                delay = (record.timestamp - origin) / 1e9 / speed - (time.perf_counter() - clock)
+                if delay > 0:
+                    time.sleep(delay)
+            yield record
+
+
+class LssReplaySerial(object):
+    # Serial port stand-in that plays back the frames read during a capture, so an
+    # LssBus can be driven by recorded traffic:
+    #
+    #   bus = LssBus(LssReplaySerial(reader, speed=10), 921600, low_latency=False)
+    #
+    # Anything written to it is ignored.
+
+    def __init__(self, reader: LssCaptureReader, start: int = None, end: int = None,
+                 speed: float = 1.0, timeout: float = 1.0, eol: bytes = b'\r'):
+        self.timeout = timeout
+        self.baudrate = None
+        self.eol = eol
+        self.frames = (record for record in reader.replay(start, end, speed) if record.direction == CAPTURE_READ)
+        self.buffer = bytearray()
+        self.done = False
+
+    def write(self, data: bytes):
+        return len(data)
+
+    def read(self, size: int = 1):
+        while len(self.buffer) < size and not self.done:
+            try:
+                self.buffer += next(self.frames).payload + self.eol
+            except StopIteration:
+                self.done = True
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        self.frames.close()
@@ -0,0 +1,183 @@
+import argparse
+import sys
+import time
+
+# Only argparse and the lss core are imported up front, ops scripts run this tool
+# thousands of times a day. Anything heavier is imported by the command using it.
+
+
+def open_bus(args):
+    from lss.settings import load_settings
+    settings = load_settings(args.config)
+    if args.port:
+        settings.port = args.port
+    if args.baud:
+        settings.baud = args.baud
+    if args.low_latency is not None:
+        settings.low_latency = args.low_latency
+    bus = settings.open_bus()
+    if args.timeout is not None:
+        bus.ser.timeout = args.timeout
+    return bus
+
+
+def query_values(bus, servo: int, parameters):
+    # queries all parameters in one burst, returns parameter -> packet. Replies are
+    # matched by servo and command, a parameter the servo does not answer is missing
+    # from the result instead of shifting the later replies.
+    wanted = {parameter.upper(): parameter for parameter in parameters}
+    bus.write_commands((servo, f'Q{parameter}') for parameter in wanted)
+    replies = {}
+    while len(replies) < len(wanted):
+        try:
+            p = bus.read()
+        except TimeoutError:
+            break
+        if p.id == servo and p.command.upper() in wanted:
+            replies[wanted[p.command.upper()]] = p
+    return replies
+
+
+def cmd_query(bus, args):
+    replies = query_values(bus, args.id, args.parameters)
+    for parameter in args.parameters:
+        if parameter not in replies:
+            print(f'error: servo {args.id} did not answer Q{parameter}', file=sys.stderr)
+            return 1
+        print(f'{args.id} {replies[parameter].command} {replies[parameter].value}')
+    return 0
+
+
+def cmd_set(bus, args):
+    bus.write_commands((args.id, command) for command in args.commands)
+    return 0
+
+
+def cmd_monitor(bus, args):
+    parameters = args.parameters.split(',')
+    period = 1.0 / args.rate
+    n = 0
+    next_time = time.perf_counter()
+    try:
+        while args.count is None or n < args.count:
+            fields = []
+            for servo in args.ids:
+                replies = query_values(bus, servo, parameters)
+                fields.append(f'{servo}:' + ','.join(
+                    str(replies[parameter].value) if parameter in replies else '-' for parameter in parameters))
+            print(f'{time.time():.3f} ' + ' '.join(fields), flush=True)
+            n += 1
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_scan(bus, args):
+    bus.ser.timeout = args.wait
+    found = 0
+    for servo in range(args.first, args.last + 1):
+        bus.write_command(servo, 'QID')
+        try:
+            p = bus.read()
+        except TimeoutError:
+            continue
+        model = query_values(bus, servo, ['MS']).get('MS')
+        print(f'{p.id} {model.value if model else "?"}')
+        found += 1
+    return 0 if found else 1
+
+
+def cmd_bench(bus, args):
+    import statistics
+    from lss.capacity import LssBusCapacity
+
+    times = []
+    errors = 0
+    for _ in range(args.count):
+        start = time.perf_counter()
+        bus.write_command(args.servo, f'Q{args.parameter}')
+        try:
+            bus.read()
+        except TimeoutError:
+            errors += 1
+            continue
+        times.append(time.perf_counter() - start)
+    if not times:
+        print(f'error: servo {args.servo} did not answer', file=sys.stderr)
+        return 1
+    times.sort()
+    rate = len(times) / sum(times)
+    predicted = 1.0 / LssBusCapacity(bus.ser.baudrate).query_time(args.servo, args.parameter)
+    print('{} round trips  {:.0f}Hz  (model {:.0f}Hz, {:.0f}%)  p50 {:.3f}ms  p99 {:.3f}ms  {}E'.format(
+        len(times), rate, predicted, rate / predicted * 100,
+        times[len(times) // 2] * 1000, times[min(len(times) - 1, int(len(times) * 0.99))] * 1000, errors))
+    if len(times) > 1:
+        print('stdev {:.3f}ms'.format(statistics.stdev(times) * 1000))
+    return 0
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='lss', description='Lynxmotion Smart Servo tool')
+    parser.add_argument('--port', help='serial port, defaults to the config file or /dev/ttyUSB0')
+    parser.add_argument('--baud', type=int, help='baud rate, defaults to the config file or 921600')
+    parser.add_argument('--config', help='yaml config file, searched for lss-testing.yml by default')
+    parser.add_argument('--low-latency', dest='low_latency', action='store_true', default=None,
+                        help='set ASYNC_LOW_LATENCY on the port')
+    parser.add_argument('--no-low-latency', dest='low_latency', action='store_false')
+    parser.add_argument('--timeout', type=float, help='reply timeout in seconds')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    query = commands.add_parser('query', help='query parameters of a servo, e.g. query 1 D V')
+    query.add_argument('id', type=int)
+    query.add_argument('parameters', nargs='+', metavar='PARAMETER')
+    query.set_defaults(run=cmd_query)
+
+    write = commands.add_parser('set', help='write commands to a servo, e.g. set 1 D900 CAS4')
+    write.add_argument('id', type=int)
+    write.add_argument('commands', nargs='+', metavar='COMMAND')
+    write.set_defaults(run=cmd_set)
+
+    monitor = commands.add_parser('monitor', help='print parameters of servos periodically')
+    monitor.add_argument('ids', type=int, nargs='+', metavar='ID')
+    monitor.add_argument('-p', '--parameters', default='D,S,C', help='comma separated parameters')
+    monitor.add_argument('--rate', type=float, default=10.0, help='lines per second')
+    monitor.add_argument('--count', type=int, help='stop after this many lines')
+    monitor.set_defaults(run=cmd_monitor)
+
+    scan = commands.add_parser('scan', help='list the servos on the bus')
+    scan.add_argument('--first', type=int, default=0)
+    scan.add_argument('--last', type=int, default=253)
+    scan.add_argument('--wait', type=float, default=0.02, help='reply timeout per id in seconds')
+    scan.set_defaults(run=cmd_scan)
+
+    bench = commands.add_parser('bench', help='measure query round trips against the bus model')
+    bench.add_argument('--servo', type=int, default=0)
+    bench.add_argument('--parameter', default='D')
+    bench.add_argument('--count', type=int, default=1000)
+    bench.set_defaults(run=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    from lss import LssException
+    try:
+        bus = open_bus(args)
+    except Exception as e:
+        print(f'error: cannot open bus: {e}', file=sys.stderr)
+        return 2
+    try:
+        return args.run(bus, args)
+    except LssException as e:
+        print(f'error: {e.message}', file=sys.stderr)
+        return 1
+    finally:
+        bus.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
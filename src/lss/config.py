@@ -0,0 +1,165 @@
+
+from lss import LssBus, LssException, REPLY, QUERY, CONFIG
+
+
+# configuration registers read by a snapshot and the attribute each one is kept in
+LssConfigRegisters = {
+    'O': 'origin_offset',
+    'AR': 'angular_range',
+    'AS': 'angular_stiffness',
+    'AH': 'holding_stiffness',
+    'AA': 'acceleration',
+    'AD': 'deceleration',
+    'G': 'gyre',
+    'EM': 'motion_profile',
+    'FPC': 'filter_position_count',
+    'MMD': 'max_motor_duty',
+    'SD': 'max_speed',
+    'HD': 'holding_delta',
+    'LN': 'negative_limit',
+    'LP': 'positive_limit',
+    'LE': 'limits_enabled',
+    'LED': 'led',
+    'LB': 'led_blinking'
+}
+
+LssConfigAttributes = {attribute: register for register, attribute in LssConfigRegisters.items()}
+
+# most queries written to the bus in one burst, keeps well within servo receive buffers
+DEFAULT_BURST = 32
+
+
+class LssServoConfig(object):
+
+    id: int
+    origin_offset: int
+    angular_range: int
+    angular_stiffness: int
+    holding_stiffness: int
+    acceleration: int
+    deceleration: int
+    gyre: int
+    motion_profile: int
+    filter_position_count: int
+    max_motor_duty: int
+    max_speed: int
+    holding_delta: int
+    negative_limit: int
+    positive_limit: int
+    limits_enabled: int
+    led: int
+    led_blinking: int
+
+    def __init__(self, id: int, values: dict = None):
+        # values may name registers either by command ('AS') or attribute ('angular_stiffness')
+        self.id = id
+        for attribute in LssConfigAttributes:
+            setattr(self, attribute, None)
+        if values:
+            for key, value in values.items():
+                self[key] = value
+
+    def __getitem__(self, key: str):
+        return getattr(self, LssConfigRegisters.get(key, key))
+
+    def __setitem__(self, key: str, value):
+        attribute = LssConfigRegisters.get(key, key)
+        if attribute not in LssConfigAttributes:
+            raise LssException(f'Unknown configuration register {key}')
+        setattr(self, attribute, value)
+
+    def __eq__(self, other):
+        return isinstance(other, LssServoConfig) and self.registers() == other.registers()
+
+    def __repr__(self):
+        return f'LssServoConfig({self.id}, {self.registers()})'
+
+    def registers(self):
+        # register -> value of every register that is known
+        return {register: getattr(self, attribute)
+                for register, attribute in LssConfigRegisters.items()
+                if getattr(self, attribute) is not None}
+
+    def diff(self, desired):
+        # register -> desired value for every register that differs, registers the
+        # desired configuration leaves out are not touched
+        if not isinstance(desired, LssServoConfig):
+            desired = LssServoConfig(self.id, desired)
+        return {register: value
+                for register, value in desired.registers().items()
+                if self[register] != value}
+
+
+def snapshot(bus: LssBus, servos, registers=None, burst: int = DEFAULT_BURST):
+    # reads the configuration of all servos with pipelined queries, returns
+    # servo -> LssServoConfig. Registers a servo did not answer stay None.
+    if registers is None:
+        registers = list(LssConfigRegisters.keys())
+    configs = {servo: LssServoConfig(servo) for servo in servos}
+    queries = [(servo, register) for servo in configs for register in registers]
+    for start in range(0, len(queries), burst):
+        chunk = queries[start:start + burst]
+        bus.write_commands((servo, QUERY + register) for servo, register in chunk)
+        for _ in chunk:
+            try:
+                p = bus.read()
+            except TimeoutError:
+                break
+            if p.direction == REPLY and p.id in configs and p.command in LssConfigRegisters:
+                configs[p.id][p.command] = p.value
+    return configs
+
+
+def apply(bus: LssBus, changes: dict, persist: bool = True):
+    # changes is servo -> {register: value}, all writes go out in one burst. Every
+    # register is written in the session form (AS4), which takes effect at once and
+    # is what queries read back; persisted registers are also written in the config
+    # form (CAS4), which survives a reset. The firmware applies some config writes,
+    # such as gyre and origin, only at the next reset, so the session write is what
+    # makes a change visible before that.
+    prefixes = ('', CONFIG) if persist else ('',)
+    bus.write_commands(
+        (servo, f'{prefix}{register}{value}')
+        for servo, registers in changes.items()
+        for register, value in registers.items()
+        for prefix in prefixes)
+
+
+def provision(bus: LssBus, profiles: dict, verify: bool = True, persist: bool = True):
+    # brings every servo in profiles (servo -> profile dict) to its profile writing
+    # only the registers that differ, returns servo -> registers that were written.
+    # verify reads the session values back; the stored config values can't be
+    # queried and are only checked by a snapshot after the next reset.
+    servos = list(profiles.keys())
+    current = snapshot(bus, servos)
+    changes = {}
+    for servo in servos:
+        if current[servo].registers() == {}:
+            raise LssException(f'Servo {servo} did not answer')
+        diff = current[servo].diff(profiles[servo])
+        if diff:
+            changes[servo] = diff
+    if changes:
+        apply(bus, changes, persist)
+        if verify:
+            readback = snapshot(bus, changes.keys(), sorted({r for diff in changes.values() for r in diff}))
+            for servo, diff in changes.items():
+                for register, value in diff.items():
+                    if readback[servo][register] != value:
+                        raise LssException(
+                            f'Servo {servo} register {register} is {readback[servo][register]}, expected {value}')
+    return changes
+
+
+def profiles_from_config(config: dict, servos):
+    # builds servo -> profile from the 'profiles' section of the yaml test
+    # configuration, the 'default' profile applies to all servos and a profile
+    # keyed by servo id overrides it
+    profiles = config.get('profiles', {}) if config else {}
+    default = profiles.get('default', {})
+    result = {}
+    for servo in servos:
+        profile = dict(default)
+        profile.update(profiles.get(servo, {}))
+        result[servo] = profile
+    return result
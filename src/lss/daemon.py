@@ -0,0 +1,390 @@
+import argparse
+import os
+import queue
+import re
+import signal
+import socket
+import struct
+import threading
+import time
+
+from lss import LssBus, LssPacket, LssException, reply_answers
+
+
+DEFAULT_SOCKET = '/tmp/lss-daemon.sock'
+
+# most requests written to a bus in one burst
+DEFAULT_MAX_BATCH = 32
+
+# how long a client waits on read() before giving up, like the serial timeout of LssBus
+DEFAULT_TIMEOUT = 2.0
+
+# Every message on the socket is a 4 byte header followed by the payload:
+#
+#   kind    uint8    one of the MSG_ values below
+#   bus     uint8    index of the bus on the daemon
+#   length  uint16   payload length
+#
+# Clients send MSG_WRITE with a packet (without eol) and MSG_BAUD with a uint32.
+# For every query written the daemon answers MSG_REPLY with the reply frame
+# (without eol) or MSG_TIMEOUT when the servo did not answer.
+frame_struct = struct.Struct('<BBH')
+baud_struct = struct.Struct('<I')
+
+MSG_WRITE = 1
+MSG_REPLY = 2
+MSG_TIMEOUT = 3
+MSG_BAUD = 4
+MSG_ERROR = 5
+
+query_re = re.compile(b'#(\\d+)Q([A-Za-z]*)')
+reply_re = re.compile(b'\\*(\\d+)Q([A-Za-z]*)')
+
+
+def encode_frame(kind: int, bus: int, payload: bytes = b''):
+    return frame_struct.pack(kind, bus, len(payload)) + payload
+
+
+def recv_exact(sock: socket.socket, length: int):
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock: socket.socket):
+    header = recv_exact(sock, frame_struct.size)
+    if header is None:
+        return None
+    kind, bus, length = frame_struct.unpack(header)
+    payload = recv_exact(sock, length) if length else b''
+    if payload is None:
+        return None
+    return kind, bus, payload
+
+
+class LssDaemonConnection(object):
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = None
+
+    def send(self, kind: int, bus: int, payload: bytes = b''):
+        if self.closed:
+            return
+        try:
+            with self.lock:
+                self.sock.sendall(encode_frame(kind, bus, payload))
+        except OSError:
+            self.closed = True
+
+
+class LssDaemon(object):
+    # Owns one or more buses and serves them to any number of local clients over a
+    # unix domain socket. Requests waiting for a bus are written to it in one burst
+    # and the replies, which servos send back in request order, are routed back to
+    # the client that asked.
+
+    def __init__(self, buses, path: str = DEFAULT_SOCKET, max_batch: int = DEFAULT_MAX_BATCH):
+        self.buses = list(buses)
+        self.path = path
+        self.max_batch = max_batch
+        self.queues = [queue.Queue() for _ in self.buses]
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.threads = []
+        self.server = None
+        self.running = False
+        self.requests = 0
+        self.batches = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen()
+        self.server.settimeout(0.1)
+        self.running = True
+        self._spawn(self._accept)
+        for index in range(len(self.buses)):
+            self._spawn(self._run_bus, index)
+
+    def stop(self):
+        self.running = False
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.closed = True
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        # client threads close their sockets and drop their connections on the way out
+        for connection in connections:
+            connection.thread.join()
+        self.server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while self.running:
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def _accept(self):
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            connection = LssDaemonConnection(sock)
+            # client threads are not kept in self.threads, clients come and go all day
+            connection.thread = threading.Thread(target=self._serve_client, args=(connection,), daemon=True)
+            with self.connections_lock:
+                self.connections.append(connection)
+            connection.thread.start()
+
+    def _serve_client(self, connection: LssDaemonConnection):
+        try:
+            while self.running:
+                try:
+                    frame = recv_frame(connection.sock)
+                except OSError:
+                    frame = None
+                if frame is None:
+                    break
+                kind, bus, payload = frame
+                error = self._check_request(kind, bus, payload)
+                if error:
+                    connection.send(MSG_ERROR, bus, error.encode('utf8'))
+                else:
+                    self.queues[bus].put((connection, kind, payload))
+        finally:
+            connection.closed = True
+            with connection.lock:
+                connection.sock.close()
+            with self.connections_lock:
+                self.connections.remove(connection)
+
+    def _check_request(self, kind: int, bus: int, payload: bytes):
+        # returns why the request can't go to a bus, or None when it can
+        if bus >= len(self.buses):
+            return f'No bus {bus}'
+        if kind == MSG_WRITE:
+            if b'\r' in payload:
+                return 'Packets must not contain an eol'
+            try:
+                LssPacket(payload.decode('utf8'))
+            except (LssException, UnicodeDecodeError):
+                return f'Invalid packet {payload!r}'
+        elif kind == MSG_BAUD:
+            if len(payload) != baud_struct.size:
+                return f'Invalid baud payload of {len(payload)} bytes'
+        else:
+            return f'Unexpected message {kind}'
+        return None
+
+    def _run_bus(self, index: int):
+        requests = self.queues[index]
+        while self.running:
+            try:
+                batch = [requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(index, batch)
+            except Exception as e:
+                # one bad request or a bus error must not stop the bus for every client
+                for connection in {connection for connection, _, _ in batch}:
+                    connection.send(MSG_ERROR, index, f'Bus {index} failed: {e}'.encode('utf8'))
+
+    def _write_batch(self, index: int, batch):
+        bus = self.buses[index]
+        frames = []
+        pending = []
+        for connection, kind, payload in batch:
+            if kind == MSG_BAUD:
+                # baud changes apply in order with the writes around them
+                self._flush(index, frames, pending)
+                frames, pending = [], []
+                bus.baudrate(baud_struct.unpack(payload)[0])
+                continue
+            frames.append(payload.decode('utf8'))
+            m = query_re.match(payload)
+            if m:
+                pending.append((connection, int(m[1]), m[2].decode().upper()))
+        self._flush(index, frames, pending)
+
+    def _flush(self, index: int, frames, pending):
+        if not frames:
+            return
+        bus = self.buses[index]
+        bus.write_packets(frames)
+        self.requests += len(frames)
+        self.batches += 1
+        while pending:
+            reply = bus.read_raw()
+            if not reply:
+                # nothing more on the bus, the remaining queries went unanswered
+                for connection, _, _ in pending:
+                    connection.send(MSG_TIMEOUT, index)
+                break
+            answered = self._answered(pending, reply)
+            if answered is not None:
+                # replies come in the order of the queries, the ones before this
+                # reply's query will not be answered anymore
+                for connection, _, _ in pending[:answered]:
+                    connection.send(MSG_TIMEOUT, index)
+                pending[answered][0].send(MSG_REPLY, index, reply)
+                pending = pending[answered + 1:]
+            if bus.listeners:
+                try:
+                    packet = LssPacket(reply.decode())
+                except (LssException, UnicodeDecodeError):
+                    # garbled on the wire, the client that asked still got the raw reply
+                    continue
+                for listener in bus.listeners:
+                    listener(packet)
+
+
+    @staticmethod
+    def _answered(pending, reply: bytes):
+        # index of the first pending query the reply answers by servo and command, or None
+        m = reply_re.match(reply)
+        if not m:
+            return None
+        servo = int(m[1])
+        letters = m[2].decode().upper()
+        for i, (_, query_servo, command) in enumerate(pending):
+            if query_servo == servo and reply_answers(letters, command):
+                return i
+        return None
+
+
+class LssClient(LssBus):
+    # Drop-in replacement for LssBus that talks to an LssDaemon instead of opening
+    # the serial port, so any number of processes can share one bus.
+
+    def __init__(self, path: str = DEFAULT_SOCKET, bus: int = 0, timeout: float = DEFAULT_TIMEOUT):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.sock.settimeout(timeout)
+        self.bus = bus
+        self.ser = None
+        self.eol = b'\r'
+        self.revert_low_latency = False
+        self.listeners = []
+        self.recorder = None
+
+    def baudrate(self, baudrate: int):
+        self.sock.sendall(encode_frame(MSG_BAUD, self.bus, baud_struct.pack(baudrate)))
+
+    def close(self):
+        self.sock.close()
+        self.sock = None
+
+    def set_low_latency(self, enable_low_latency: bool, ignore_error=False):
+        # latency is the daemon's business
+        return True
+
+    def write(self, packet):
+        if not isinstance(packet, str):
+            packet = str(packet)
+        self.sock.sendall(encode_frame(MSG_WRITE, self.bus, packet.encode('utf8')))
+
+    def write_command(self, id, command: str):
+        self.sock.sendall(encode_frame(MSG_WRITE, self.bus, f'#{id}{command}'.encode('utf8')))
+
+    def write_packets(self, packets):
+        self.sock.sendall(b''.join(
+            encode_frame(MSG_WRITE, self.bus, (p if isinstance(p, str) else str(p)).encode('utf8'))
+            for p in packets))
+
+    def write_commands(self, commands):
+        self.sock.sendall(b''.join(
+            encode_frame(MSG_WRITE, self.bus, f'#{id}{command}'.encode('utf8')) for id, command in commands))
+
+    def write_raw(self, data: bytes):
+        self.sock.sendall(b''.join(
+            encode_frame(MSG_WRITE, self.bus, frame) for frame in data.split(self.eol) if frame))
+
+    def read_raw(self):
+        try:
+            frame = recv_frame(self.sock)
+        except socket.timeout:
+            return b''
+        if frame is None:
+            raise LssException('Connection to lss daemon closed')
+        kind, bus, payload = frame
+        if kind == MSG_REPLY:
+            return payload
+        if kind == MSG_ERROR:
+            raise LssException(payload.decode('utf8'))
+        return b''
+
+
+def parse_bus(spec: str):
+    # <port>[:<baud>]
+    port, _, baud = spec.partition(':')
+    return port, int(baud) if baud else 921600
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shares LSS buses with local clients over a unix socket')
+    parser.add_argument('buses', nargs='+', metavar='PORT[:BAUD]', help='serial ports to own, in bus index order')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='unix socket path')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help='most requests per bus burst')
+    parser.add_argument('--no-low-latency', action='store_true', help='leave ASYNC_LOW_LATENCY alone')
+    parser.add_argument('--reconnect', action='store_true', help='reopen ports that go away, e.g. unplugged adapters')
+    args = parser.parse_args()
+
+    if args.reconnect:
+        from lss.resilient import LssResilientBus as bus_type
+    else:
+        bus_type = LssBus
+    buses = [bus_type(port, baud, low_latency=not args.no_low_latency) for port, baud in map(parse_bus, args.buses)]
+    daemon = LssDaemon(buses, args.socket, args.max_batch)
+    signal.signal(signal.SIGTERM, lambda signum, frame: setattr(daemon, 'running', False))
+    print(f'serving {len(buses)} bus(es) on {args.socket}')
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for bus in buses:
+            bus.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import os
+import select
+import threading
+import time
+import tty
+
+from lss import LssPacket, LssException, REQUEST, REPLY, QUERY, CONFIG
+
+
+# register values an emulated servo starts with
+LssEmulatedDefaults = {
+    'D': 0,
+    'DT': 0,
+    'MD': 0,
+    'WD': 0,
+    'VT': 0,
+    'WR': 0,
+    'P': 1500,
+    'Q': 1,
+    'EM': 1,
+    'FPC': 5,
+    'O': 0,
+    'AR': 1800,
+    'AS': 0,
+    'AH': 4,
+    'AA': 100,
+    'AD': 100,
+    'G': 1,
+    'MMD': 1023,
+    'S': 0,
+    'SD': 600,
+    'SR': 100,
+    'V': 11900,
+    'T': 350,
+    'C': 120,
+    'LED': 0,
+    'LB': 0,
+    'MS': 'LSS-ST1',
+    'F': 368,
+    'N': '12345678',
+    'HD': 30,
+    'LN': -1800,
+    'LP': 1800,
+    'LE': 0,
+    'CSL': 100,
+    'IPE': 1,
+    'PO': 0,
+    'CR': 1,
+    'TQ': 0,
+    'TQT': 0,
+    'TQM': 1000,
+    'Y': 0
+}
+
+
+# config writes the firmware only applies at the next reset, the session value
+# stays as it was until then
+LssEmulatedResetOnly = {'G', 'O', 'B', 'ID'}
+
+
+class LssEmulatedServo(object):
+
+    id: int
+    registers: dict
+    config: dict
+
+    def __init__(self, id: int, **registers):
+        self.id = id
+        self.registers = dict(LssEmulatedDefaults)
+        self.registers['ID'] = id
+        self.registers.update(registers)
+        self.config = {}    # register -> value of config writes, kept across resets
+
+    def reset(self):
+        self.registers.update(self.config)
+
+    def handle(self, packet: LssPacket):
+        # returns the reply frame (without eol) or None for commands that are not answered
+        if packet.kind == QUERY:
+            if packet.command not in self.registers:
+                return None
+            return f'{REPLY}{self.id}{QUERY}{packet.command}{self.registers[packet.command]}'
+
+        if packet.value is None:
+            return None
+        if packet.command == 'D':
+            # emulated servos arrive instantly
+            self.registers['DT'] = packet.value
+            self.registers['D'] = packet.value
+        elif packet.command == 'MD':
+            self.registers['DT'] = self.registers['D'] + packet.value
+            self.registers['D'] = self.registers['DT']
+        elif packet.kind == CONFIG:
+            self.config[packet.command] = packet.value
+            if packet.command not in LssEmulatedResetOnly:
+                self.registers[packet.command] = packet.value
+        elif packet.command in self.registers:
+            self.registers[packet.command] = packet.value
+        return None
+
+
+class LssEmulator(object):
+    # Emulates a bus of LSS servos behind a pseudo-terminal, so an LssBus can open
+    # emulator.port as if it were a USB serial adapter. When baud is given, replies
+    # are held back for the wire time of the request and reply frames so measured
+    # throughput resembles a real bus.
+
+    def __init__(self, servos=None, baud: int = None, turnaround: float = 0.0, link: str = None):
+        if servos is None:
+            servos = [0]
+        self.servos = {}
+        for servo in servos:
+            if not isinstance(servo, LssEmulatedServo):
+                servo = LssEmulatedServo(servo)
+            self.servos[servo.id] = servo
+        self.baud = baud
+        self.turnaround = turnaround
+        self.link = link
+        self.eol = b'\r'
+        self.requests = 0
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.thread = None
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        if self.link:
+            if os.path.lexists(self.link):
+                os.unlink(self.link)
+            os.symlink(self.port, self.link)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, args=(self.master,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+        if self.link and os.path.lexists(self.link):
+            os.unlink(self.link)
+
+    def wire_time(self, nbytes: int):
+        return nbytes * 10 / self.baud if self.baud else 0.0
+
+    def _serve(self, fd: int):
+        buffer = bytearray()
+        while self.running:
+            ready, _, _ = select.select([fd], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break
+            buffer += data
+            while True:
+                end = buffer.find(self.eol)
+                if end < 0:
+                    break
+                frame = bytes(buffer[:end])
+                del buffer[:end + len(self.eol)]
+                reply = self.respond(frame)
+                delay = self.wire_time(len(frame) + len(self.eol))
+                if reply is not None:
+                    reply = reply.encode('utf8') + self.eol
+                    delay += self.turnaround + self.wire_time(len(reply))
+                if delay > 0:
+                    time.sleep(delay)
+                if reply is not None:
+                    os.write(fd, reply)
+
+    def respond(self, frame: bytes):
+        self.requests += 1
+        try:
+            packet = LssPacket(frame.decode('utf8'))
+        except (LssException, UnicodeDecodeError):
+            return None
+        if packet.direction != REQUEST:
+            return None
+        if packet.id == 254:
+            # broadcast, every servo acts but none reply
+            for servo in self.servos.values():
+                servo.handle(packet)
+            return None
+        servo = self.servos.get(packet.id)
+        return servo.handle(packet) if servo else None
@@ -0,0 +1,242 @@
+import time
+
+import numpy as np
+
+from lss import LssBus, LssPacket, LssException, REPLY
+
+
+# samples kept per (servo, parameter) when no capacity is given, 10 minutes at 100Hz
+DEFAULT_CAPACITY = 60000
+
+# streams allocated on the fly when servos and parameters are not given, with the
+# default capacity about 60MB
+DEFAULT_MAX_STREAMS = 64
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+class LssWindowStats(object):
+    # statistics of the samples of one stream within a time window, NaN when empty
+
+    count: int
+    start: float
+    end: float
+    min: float
+    max: float
+    mean: float
+    percentiles: dict
+
+    def __init__(self, times, values, percentiles=DEFAULT_PERCENTILES):
+        self.count = len(values)
+        if self.count:
+            self.start = float(times[0])
+            self.end = float(times[-1])
+            self.min = float(values.min())
+            self.max = float(values.max())
+            self.mean = float(values.mean())
+            self.percentiles = dict(zip(percentiles, np.percentile(values, percentiles).tolist()))
+        else:
+            self.start = self.end = self.min = self.max = self.mean = float('nan')
+            self.percentiles = {p: float('nan') for p in percentiles}
+
+    def __repr__(self):
+        return 'LssWindowStats({} samples, min {:g}, max {:g}, mean {:g})'.format(
+            self.count, self.min, self.max, self.mean)
+
+
+class LssDownsampled(object):
+    # one entry per non-empty bucket: the bucket start time and the min/max/mean of its samples
+
+    def __init__(self, times, minimum, maximum, mean, count):
+        self.times = times
+        self.min = minimum
+        self.max = maximum
+        self.mean = mean
+        self.count = count
+
+    def __len__(self):
+        return len(self.times)
+
+
+class LssRingBuffer(object):
+    # Timestamps and values of one stream in two preallocated arrays. Appending
+    # overwrites the oldest sample once the buffer is full, so the memory used is
+    # fixed by the capacity. Timestamps must not go backwards.
+
+    capacity: int
+    size: int
+    head: int
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity <= 0:
+            raise LssException('Ring buffer capacity must be positive')
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+        self.head = 0   # where the next sample goes
+        self.appended = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+    def append(self, t: float, value):
+        i = self.head
+        self.times[i] = t
+        self.values[i] = value
+        i += 1
+        self.head = i if i < self.capacity else 0
+        if self.size < self.capacity:
+            self.size += 1
+        self.appended += 1
+
+    def clear(self):
+        self.size = 0
+        self.head = 0
+
+    def last(self):
+        # (time, value) of the newest sample, or None
+        if not self.size:
+            return None
+        i = self.head - 1
+        return float(self.times[i]), self.values[i].item()
+
+    def _segments(self):
+        # the stored samples as at most two slices, oldest first, each sorted by time
+        if self.size < self.capacity:
+            return [slice(0, self.size)]
+        return [slice(self.head, self.capacity), slice(0, self.head)]
+
+    def window(self, start: float = None, end: float = None):
+        # (times, values) of the samples with start <= t <= end, oldest first. Only
+        # the samples in the window are copied.
+        times = []
+        values = []
+        for segment in self._segments():
+            t = self.times[segment]
+            lo = 0 if start is None else np.searchsorted(t, start, 'left')
+            hi = len(t) if end is None else np.searchsorted(t, end, 'right')
+            if hi > lo:
+                times.append(t[lo:hi])
+                values.append(self.values[segment][lo:hi])
+        if not times:
+            return np.empty(0, dtype=self.times.dtype), np.empty(0, dtype=self.values.dtype)
+        if len(times) == 1:
+            return times[0].copy(), values[0].copy()
+        return np.concatenate(times), np.concatenate(values)
+
+    def stats(self, start: float = None, end: float = None, percentiles=DEFAULT_PERCENTILES):
+        return LssWindowStats(*self.window(start, end), percentiles=percentiles)
+
+    def downsample(self, bucket: float, start: float = None, end: float = None):
+        # min/max/mean per bucket of `bucket` seconds, buckets aligned to start (or
+        # to the first sample), for plotting long windows with a few points
+        if bucket <= 0:
+            raise LssException('Downsample bucket must be positive')
+        t, v = self.window(start, end)
+        if not len(t):
+            empty = np.empty(0)
+            return LssDownsampled(empty, empty, empty, empty, np.empty(0, dtype=np.int64))
+        origin = t[0] if start is None else start
+        bins = np.floor((t - origin) / bucket).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+        count = np.diff(np.append(starts, len(t)))
+        v = v.astype(np.float64, copy=False)
+        return LssDownsampled(
+            origin + bins[starts] * bucket,
+            np.minimum.reduceat(v, starts),
+            np.maximum.reduceat(v, starts),
+            np.add.reduceat(v, starts) / count,
+            count)
+
+
+class LssTelemetryHistory(object):
+    # Keeps the recent replies of every (servo, parameter) in ring buffers:
+    #
+    #   history = LssTelemetryHistory(bus, capacity=6000, servos=[1, 2], parameters=['D', 'C'])
+    #   ...
+    #   history.stats(1, 'C', start=history.clock() - 10).max
+    #
+    # With servos and parameters given all buffers are allocated up front, so memory
+    # use is known before the first sample. Otherwise a buffer is allocated the first
+    # time a stream is seen, for known commands only and for at most max_streams
+    # streams; samples that find no buffer are counted in skipped.
+
+    capacity: int
+    max_streams: int
+    servos: set or None
+    parameters: set or None
+    buffers: dict
+    skipped: int
+
+    def __init__(self, bus: LssBus = None, capacity: int = DEFAULT_CAPACITY, servos=None, parameters=None,
+                 clock=time.monotonic, max_streams: int = DEFAULT_MAX_STREAMS):
+        self.bus = bus
+        self.capacity = capacity
+        self.max_streams = max_streams
+        self.servos = set(servos) if servos is not None else None
+        self.parameters = set(parameters) if parameters is not None else None
+        self.clock = clock
+        self.buffers = {}
+        self.skipped = 0
+        if self.servos is not None and self.parameters is not None:
+            for servo in self.servos:
+                for parameter in self.parameters:
+                    self.buffers[(servo, parameter)] = LssRingBuffer(capacity)
+        if bus:
+            bus.add_listener(self.record)
+
+    def close(self):
+        if self.bus:
+            self.bus.remove_listener(self.record)
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def record(self, packet: LssPacket, t: float = None):
+        # bus listener, stores numeric query replies
+        if packet.direction != REPLY or not isinstance(packet.value, int):
+            return
+        key = (packet.id, packet.command)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            if (self.servos is not None and packet.id not in self.servos) or \
+                    (self.parameters is not None and packet.command not in self.parameters):
+                return
+            if (self.parameters is None and not packet.known) or len(self.buffers) >= self.max_streams:
+                self.skipped += 1
+                return
+            buffer = self.buffers[key] = LssRingBuffer(self.capacity)
+        buffer.append(self.clock() if t is None else t, packet.value)
+
+    def streams(self):
+        # (servo, parameter) of every stream with samples
+        return [key for key, buffer in self.buffers.items() if buffer.size]
+
+    def buffer(self, servo: int, parameter: str):
+        buffer = self.buffers.get((servo, parameter))
+        if buffer is None:
+            raise LssException(f'No telemetry recorded for servo {servo} {parameter}')
+        return buffer
+
+    def last(self, servo: int, parameter: str):
+        return self.buffer(servo, parameter).last()
+
+    def window(self, servo: int, parameter: str, start: float = None, end: float = None):
+        return self.buffer(servo, parameter).window(start, end)
+
+    def stats(self, servo: int, parameter: str, start: float = None, end: float = None,
+              percentiles=DEFAULT_PERCENTILES):
+        return self.buffer(servo, parameter).stats(start, end, percentiles)
+
+    def recent(self, servo: int, parameter: str, seconds: float, percentiles=DEFAULT_PERCENTILES):
+        # statistics of the last `seconds`
+        return self.stats(servo, parameter, self.clock() - seconds, None, percentiles)
+
+    def downsample(self, servo: int, parameter: str, bucket: float, start: float = None, end: float = None):
+        return self.buffer(servo, parameter).downsample(bucket, start, end)
@@ -0,0 +1,202 @@
+import array
+import os
+import statistics
+import time
+
+from lss import LssBus, LssException
+
+
+# ASYNC_LOW_LATENCY in the flags of struct serial_struct
+ASYNC_LOW_LATENCY = 0x2000
+
+# latency timer of FTDI adapters in ms, the driver default is 16
+DEFAULT_LATENCY_TIMER = 1
+
+
+class LssSerialAdapter(object):
+
+    tty: str
+    device: str or None
+    driver: str or None
+    vendor: str or None
+    product: str or None
+    latency_timer: str or None
+
+    def __init__(self, tty: str, device: str = None, driver: str = None, vendor: str = None,
+                 product: str = None, latency_timer: str = None):
+        self.tty = tty
+        self.device = device
+        self.driver = driver
+        self.vendor = vendor
+        self.product = product
+        self.latency_timer = latency_timer
+
+    def __repr__(self):
+        return 'LssSerialAdapter({}, driver={}, usb={}:{})'.format(self.tty, self.driver, self.vendor, self.product)
+
+
+def read_sysfs(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def discover_adapter(port: str, sysfs_root: str = '/sys'):
+    # finds the device behind a tty through sysfs: its driver, the USB vendor and
+    # product ids of the nearest USB ancestor and the FTDI latency_timer attribute
+    tty = os.path.basename(os.path.realpath(port))
+    device_link = os.path.join(sysfs_root, 'class', 'tty', tty, 'device')
+    if not os.path.exists(device_link):
+        return LssSerialAdapter(tty)
+    device = os.path.realpath(device_link)
+    driver = os.path.join(device, 'driver')
+    adapter = LssSerialAdapter(
+        tty,
+        device,
+        os.path.basename(os.path.realpath(driver)) if os.path.exists(driver) else None)
+    latency_timer = os.path.join(device, 'latency_timer')
+    if os.path.exists(latency_timer):
+        adapter.latency_timer = latency_timer
+    root = os.path.realpath(sysfs_root)
+    path = device
+    while path.startswith(root) and path != root:
+        vendor = read_sysfs(os.path.join(path, 'idVendor'))
+        if vendor is not None:
+            adapter.vendor = vendor
+            adapter.product = read_sysfs(os.path.join(path, 'idProduct'))
+            break
+        path = os.path.dirname(path)
+    return adapter
+
+
+class LssLatencyTuner(object):
+    # Tunes everything between the serial port and the interpreter that adds to the
+    # round trip time of a query: the ASYNC_LOW_LATENCY flag, the USB latency timer of
+    # FTDI adapters and the termios VMIN/VTIME read parameters. Original settings are
+    # remembered so restore() can put them back.
+    #
+    # Writing the latency timer usually needs root or a udev rule.
+
+    def __init__(self, bus: LssBus, port: str = None, sysfs_root: str = '/sys'):
+        self.bus = bus
+        self.port = port if port is not None else bus.ser.port
+        self.sysfs_root = sysfs_root
+        self.adapter = discover_adapter(self.port, sysfs_root)
+        self.saved_latency_timer = None
+        self.saved_termios = None
+        self.saved_low_latency = None
+
+    def get_latency_timer(self):
+        if self.adapter.latency_timer is None:
+            return None
+        value = read_sysfs(self.adapter.latency_timer)
+        return int(value) if value is not None else None
+
+    def set_latency_timer(self, ms: int):
+        if self.adapter.latency_timer is None:
+            return False
+        try:
+            with open(self.adapter.latency_timer, 'w') as f:
+                f.write(f'{ms}\n')
+        except OSError as e:
+            raise LssException(f'Failed to set latency timer of {self.adapter.tty} to {ms}ms: {e}')
+        return True
+
+    def get_low_latency(self):
+        buf = array.array('i', [0] * 32)
+        try:
+            import fcntl
+            import termios
+            fcntl.ioctl(self.bus.ser.fd, termios.TIOCGSERIAL, buf)
+        except (ModuleNotFoundError, AttributeError, IOError):
+            return None
+        return bool(buf[4] & ASYNC_LOW_LATENCY)
+
+    def get_read_parameters(self):
+        # (VMIN, VTIME) of the port
+        try:
+            import termios
+        except ModuleNotFoundError:
+            return None   # probably on windows
+        try:
+            cc = termios.tcgetattr(self.bus.ser.fd)[6]
+        except (AttributeError, termios.error):
+            return None
+        return cc[termios.VMIN], cc[termios.VTIME]
+
+    def set_read_parameters(self, vmin: int, vtime: int):
+        # pyserial rewrites these when the port is reconfigured, e.g. on a baudrate
+        # change, so apply() again afterwards
+        import termios
+        attributes = termios.tcgetattr(self.bus.ser.fd)
+        attributes[6][termios.VMIN] = vmin
+        attributes[6][termios.VTIME] = vtime
+        termios.tcsetattr(self.bus.ser.fd, termios.TCSANOW, attributes)
+
+    def apply(self, latency_timer: int = DEFAULT_LATENCY_TIMER, vmin: int = 0, vtime: int = 0,
+              low_latency: bool = True, ignore_error: bool = False):
+        # originals are only kept for what was actually changed, so restore() never
+        # touches a setting apply() failed to set
+        original = self.get_latency_timer()
+        try:
+            if self.set_latency_timer(latency_timer) and self.saved_latency_timer is None:
+                self.saved_latency_timer = original
+        except LssException as e:
+            if not ignore_error:
+                raise
+            print(f'warning: {e.message}')
+        original = self.get_read_parameters()
+        if original is not None:
+            self.set_read_parameters(vmin, vtime)
+            if self.saved_termios is None:
+                self.saved_termios = original
+        original = self.get_low_latency()
+        if original is not None:
+            if self.bus.set_low_latency(low_latency, ignore_error) and self.saved_low_latency is None:
+                self.saved_low_latency = original
+        return self.report()
+
+    def restore(self):
+        if self.saved_latency_timer is not None:
+            self.set_latency_timer(self.saved_latency_timer)
+            self.saved_latency_timer = None
+        if self.saved_termios is not None:
+            self.set_read_parameters(*self.saved_termios)
+            self.saved_termios = None
+        if self.saved_low_latency is not None:
+            self.bus.set_low_latency(self.saved_low_latency, True)
+            self.saved_low_latency = None
+
+    def report(self):
+        # the effective configuration, None where a setting does not apply to the port
+        read_parameters = self.get_read_parameters()
+        return {
+            'port': self.port,
+            'tty': self.adapter.tty,
+            'driver': self.adapter.driver,
+            'usb_id': f'{self.adapter.vendor}:{self.adapter.product}' if self.adapter.vendor else None,
+            'baudrate': self.bus.ser.baudrate,
+            'low_latency': self.get_low_latency(),
+            'latency_timer': self.get_latency_timer(),
+            'vmin': read_parameters[0] if read_parameters else None,
+            'vtime': read_parameters[1] if read_parameters else None
+        }
+
+    def measure_round_trip(self, servo: int = 0, command: str = 'QD', count: int = 50):
+        # round trip times of a query in seconds
+        times = []
+        for _ in range(count):
+            start = time.perf_counter()
+            self.bus.write_command(servo, command)
+            self.bus.read()
+            times.append(time.perf_counter() - start)
+        return times
+
+    def tune(self, servo: int = 0, count: int = 50, **settings):
+        # applies the settings and returns the median round trip before and after, in seconds
+        before = statistics.median(self.measure_round_trip(servo, count=count))
+        self.apply(**settings)
+        after = statistics.median(self.measure_round_trip(servo, count=count))
+        return before, after
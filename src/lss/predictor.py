@@ -0,0 +1,224 @@
+import math
+import time
+
+from lss import LssBus, LssPacket, LssException, REQUEST, REPLY, QUERY
+
+
+# defaults for servos whose SD, AA and AD settings were never seen, in tenths of
+# degrees per second and tenths of degrees per second squared
+DEFAULT_MAX_SPEED = 1800.0
+DEFAULT_ACCELERATION = 10000.0
+
+# AA and AD are set in steps of 10 degrees per second squared
+ACCELERATION_STEP = 100.0
+
+# position error of a single QD reading, in tenths of degrees
+DEFAULT_MEASUREMENT_NOISE = 2.0
+
+# how much the servo may drift from the model while it is not commanded to move,
+# in tenths of degrees per second
+DEFAULT_DRIFT = 5.0
+
+# fraction of the distance the model says a servo moved since it was last measured
+# that is assumed to be wrong
+DEFAULT_TRACKING_ERROR = 0.1
+
+# uncertainty in tenths of degrees above which the poller queries a servo
+DEFAULT_THRESHOLD = 20.0
+
+
+class LssMovePlan(object):
+    # trapezoidal velocity profile from start to target, starting and ending at rest
+
+    def __init__(self, start: float, target: float, t0: float, speed: float, acceleration: float,
+                 deceleration: float, duration: float = None):
+        self.start = start
+        self.target = target
+        self.t0 = t0
+        distance = abs(target - start)
+        self.direction = math.copysign(1.0, target - start)
+        if duration is not None:
+            # timed move, the servo spreads the move over the requested time
+            duration = max(duration, 1e-6)
+            self.speed = distance / duration
+            self.t_accel = self.t_decel = 0.0
+            self.acceleration = self.deceleration = math.inf
+        else:
+            self.acceleration = acceleration
+            self.deceleration = deceleration
+            if distance < speed * speed / 2 * (1 / acceleration + 1 / deceleration):
+                # too short to reach full speed
+                speed = math.sqrt(2 * distance * acceleration * deceleration / (acceleration + deceleration))
+            self.speed = speed
+            self.t_accel = speed / acceleration if speed else 0.0
+            self.t_decel = speed / deceleration if speed else 0.0
+        d_accel = self.speed * self.t_accel / 2
+        d_decel = self.speed * self.t_decel / 2
+        self.t_cruise = (distance - d_accel - d_decel) / self.speed if self.speed else 0.0
+        self.t_end = t0 + self.t_accel + self.t_cruise + self.t_decel
+
+    def at(self, t: float):
+        # (position, velocity) at time t
+        tau = t - self.t0
+        if tau <= 0:
+            return self.start, 0.0
+        if t >= self.t_end:
+            return self.target, 0.0
+        if tau < self.t_accel:
+            d = self.acceleration * tau * tau / 2
+            v = self.acceleration * tau
+        elif tau < self.t_accel + self.t_cruise:
+            d = self.speed * self.t_accel / 2 + self.speed * (tau - self.t_accel)
+            v = self.speed
+        else:
+            remaining = self.t_end - t
+            d = abs(self.target - self.start) - self.deceleration * remaining * remaining / 2
+            v = self.deceleration * remaining
+        return self.start + self.direction * d, self.direction * v
+
+
+class LssServoEstimator(object):
+    # Predicts the position and velocity of one servo from the last commanded move
+    # and the last position reading, and how far off that prediction may be.
+
+    def __init__(self, id: int, max_speed: float = DEFAULT_MAX_SPEED, acceleration: float = DEFAULT_ACCELERATION,
+                 deceleration: float = DEFAULT_ACCELERATION, measurement_noise: float = DEFAULT_MEASUREMENT_NOISE,
+                 drift: float = DEFAULT_DRIFT, tracking_error: float = DEFAULT_TRACKING_ERROR):
+        self.id = id
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        self.measurement_noise = measurement_noise
+        self.drift = drift
+        self.tracking_error = tracking_error
+        self.plan = None
+        self.bias = 0.0
+        self.measured_at = None
+        # measured minus predicted velocity of the last QS reply, and when it was read
+        self.velocity_error = 0.0
+        self.velocity_measured_at = None
+
+    def command(self, packet: LssPacket, t: float):
+        # feeds a request written to the servo
+        if packet.value is None:
+            return
+        if packet.command == 'SD':
+            self.max_speed = float(packet.value)
+        elif packet.command == 'AA':
+            self.acceleration = packet.value * ACCELERATION_STEP
+        elif packet.command == 'AD':
+            self.deceleration = packet.value * ACCELERATION_STEP
+        elif packet.command in ('D', 'MD'):
+            start = self.predict(t)[0] if self.plan else None
+            if packet.command == 'D':
+                target = float(packet.value)
+            elif start is not None:
+                target = start + packet.value
+            else:
+                # relative move from an unknown position
+                return
+            if start is None:
+                start = target
+            speed = float(packet.modifiers.get('SD', self.max_speed))
+            duration = packet.modifiers['T'] / 1000 if 'T' in packet.modifiers else None
+            self.plan = LssMovePlan(start, target, t, speed, self.acceleration, self.deceleration, duration)
+            self.bias = 0.0
+            self.velocity_error = 0.0
+
+    def measure(self, packet: LssPacket, t: float):
+        # feeds a query reply from the servo
+        if not isinstance(packet.value, int):
+            return
+        if packet.command == 'D':
+            if self.plan is None:
+                self.plan = LssMovePlan(packet.value, packet.value, t, 0.0, self.acceleration, self.deceleration)
+            self.bias = packet.value - self.plan.at(t)[0]
+            self.measured_at = t
+        elif packet.command == 'S':
+            if self.plan is not None:
+                self.velocity_error = packet.value - self.plan.at(t)[1]
+                self.velocity_measured_at = t
+        elif packet.command == 'SD':
+            self.max_speed = float(packet.value)
+        elif packet.command == 'AA':
+            self.acceleration = packet.value * ACCELERATION_STEP
+        elif packet.command == 'AD':
+            self.deceleration = packet.value * ACCELERATION_STEP
+
+    def predict(self, t: float):
+        # (position, velocity) in tenths of degrees and tenths of degrees per second
+        if self.plan is None:
+            raise LssException(f'Nothing known about servo {self.id} yet')
+        position, velocity = self.plan.at(t)
+        return position + self.bias, velocity
+
+    def uncertainty(self, t: float):
+        # expected error of predict(t) in tenths of degrees, infinite until measured. A
+        # QS reply that disagrees with the model adds the difference in speed for the
+        # time since the last reading.
+        if self.measured_at is None:
+            return math.inf
+        moved = abs(self.plan.at(t)[0] - self.plan.at(self.measured_at)[0])
+        since = max(self.measured_at, self.velocity_measured_at or self.measured_at)
+        return self.measurement_noise + self.drift * abs(t - self.measured_at) + self.tracking_error * moved + \
+            abs(self.velocity_error) * max(0.0, t - since)
+
+
+class LssAdaptivePoller(object):
+    # Keeps an estimator per servo up to date from everything written through it and
+    # every reply the bus reads, and only queries positions that are uncertain:
+    #
+    #   poller = LssAdaptivePoller(bus, [1, 2, 3])
+    #   poller.write_command(1, 'D900T500')
+    #   ...
+    #   poller.poll()                     # queries only servos over the threshold
+    #   position, velocity = poller.predict(1)
+
+    def __init__(self, bus: LssBus, servos, threshold: float = DEFAULT_THRESHOLD,
+                 max_interval: float = 1.0, clock=time.monotonic, **estimator_settings):
+        self.bus = bus
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.clock = clock
+        self.estimators = {servo: LssServoEstimator(servo, **estimator_settings) for servo in servos}
+        self.queries = 0
+        self.skipped = 0
+        bus.add_listener(self.observe)
+
+    def close(self):
+        self.bus.remove_listener(self.observe)
+
+    def observe(self, packet: LssPacket):
+        estimator = self.estimators.get(packet.id)
+        if estimator and packet.direction == REPLY:
+            estimator.measure(packet, self.clock())
+
+    def write_command(self, id, command: str):
+        self.bus.write_command(id, command)
+        estimator = self.estimators.get(id)
+        if estimator:
+            estimator.command(LssPacket(f'{REQUEST}{id}{command}'), self.clock())
+
+    def predict(self, servo: int, t: float = None):
+        return self.estimators[servo].predict(self.clock() if t is None else t)
+
+    def due(self, t: float = None):
+        # servos whose prediction is too uncertain or that were not read for max_interval
+        if t is None:
+            t = self.clock()
+        return [servo for servo, estimator in self.estimators.items()
+                if estimator.uncertainty(t) > self.threshold or t - estimator.measured_at > self.max_interval]
+
+    def poll(self):
+        # queries the position of every due servo in one burst, returns the servos queried
+        servos = self.due()
+        self.skipped += len(self.estimators) - len(servos)
+        if servos:
+            self.bus.write_commands((servo, QUERY + 'D') for servo in servos)
+            for _ in servos:
+                try:
+                    self.bus.read()
+                except TimeoutError:
+                    break
+            self.queries += len(servos)
+        return servos
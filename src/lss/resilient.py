@@ -0,0 +1,215 @@
+import collections
+import re
+import time
+
+from lss import LssBus, LssPacket, LssException, QUERY, reply_answers
+
+
+# commands that leave a servo in the same state however often they are sent, so a
+# write that failed when the port was lost can safely be sent again
+LssIdempotentCommands = {
+    'D', 'DT', 'WD', 'WR', 'P', 'L', 'H', 'EM', 'FPC', 'O', 'AR', 'AS', 'AH', 'AA', 'AD',
+    'G', 'MMD', 'SD', 'SR', 'LED', 'LB', 'TQT', 'TQM', 'Y'
+}
+
+# replies kept as servo metadata, reported by known_servos() and kept across reconnects
+LssMetadataCommands = {'ID', 'MS', 'F', 'N', 'B', 'CR'}
+
+DEFAULT_INITIAL_BACKOFF = 0.01
+DEFAULT_MAX_BACKOFF = 0.5
+DEFAULT_RECONNECT_TIMEOUT = 30.0
+
+# queries still waiting for their reply, older ones are forgotten
+MAX_IN_FLIGHT = 256
+
+frame_re = re.compile(b'#(\\d+)(Q|C)?([A-Za-z]*)')
+reply_re = re.compile(b'\\*(\\d+)Q([A-Za-z]*)')
+
+
+class LssBusIncident(object):
+    # one loss of the port, from the failed read or write to the reopened port
+
+    error: str
+    lost: float
+    restored: float or None
+    attempts: int
+    replayed: int
+    dropped: int
+
+    def __init__(self, error: Exception, lost: float):
+        self.error = str(error)
+        self.lost = lost
+        self.restored = None
+        self.attempts = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    @property
+    def downtime(self):
+        return None if self.restored is None else self.restored - self.lost
+
+    def __repr__(self):
+        state = f'{self.downtime * 1000:.1f}ms down' if self.restored is not None else 'not restored'
+        return f'LssBusIncident({state}, {self.attempts} attempts, {self.replayed} replayed, ' \
+               f'{self.dropped} dropped: {self.error})'
+
+
+class LssResilientBus(LssBus):
+    # An LssBus that survives the USB serial adapter going away:
+    #
+    #   bus = LssResilientBus('/dev/serial/by-id/usb-FTDI_...', 921600)
+    #
+    # A read or write failing with OSError (pyserial's SerialException is one) closes
+    # the port and reopens it by name, retrying with exponential backoff until
+    # reconnect_timeout. The reopened port gets the baud rate, timeout and low
+    # latency setting of the old one, then every reconnect hook runs, e.g. a
+    # LssLatencyTuner's apply. Queries written but not yet answered are written
+    # again, so a read waiting for them still gets its reply. Of a write that
+    # failed, the queries, config writes and idempotent commands are sent again;
+    # other commands such as relative moves are dropped and counted in the incident.
+    #
+    # Listeners, the recorder and the metadata of servos seen so far belong to the
+    # bus, not the port, so nothing has to be rediscovered after a reconnect. Use a
+    # stable device name such as /dev/serial/by-id/..., a replugged adapter may not
+    # get its old ttyUSB number back.
+
+    def __init__(self, port: str, baud: int, low_latency=True, timeout: float = 1.0,
+                 initial_backoff: float = DEFAULT_INITIAL_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 reconnect_timeout: float = DEFAULT_RECONNECT_TIMEOUT, clock=time.monotonic):
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.low_latency = low_latency
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.reconnect_timeout = reconnect_timeout
+        self.clock = clock
+        # (id, command, frame) of queries written, in order, command '' for the status query
+        self.in_flight = collections.deque(maxlen=MAX_IN_FLIGHT)
+        self.servos = {}        # id -> {command: value} of metadata replies
+        self.incidents = []
+        self.reconnect_hooks = []
+        self.closed = False
+        super().__init__(self.open_port(), baud, low_latency)
+
+    def open_port(self):
+        import serial
+        return serial.Serial(self.port, self.baud, timeout=self.timeout)
+
+    def add_reconnect_hook(self, hook):
+        # hooks are called with the bus after the port was reopened and set up
+        self.reconnect_hooks.append(hook)
+
+    def remove_reconnect_hook(self, hook):
+        self.reconnect_hooks.remove(hook)
+
+    @property
+    def downtime(self):
+        # total seconds without a port
+        return sum(incident.downtime or 0.0 for incident in self.incidents)
+
+    def known_servos(self):
+        return dict(self.servos)
+
+    def baudrate(self, baudrate: int):
+        super().baudrate(baudrate)
+        self.baud = baudrate
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+    def write_raw(self, data: bytes):
+        while data:
+            try:
+                self.ser.write(data)
+                break
+            except OSError as e:
+                data = self.replayable(data, self.reconnect(e))
+        if self.recorder and data:
+            self.recorder.record_write(data)
+        if QUERY.encode() in data:
+            for m in frame_re.finditer(data):
+                if m[2] == b'Q':
+                    self.in_flight.append((int(m[1]), m[3].decode().upper(), m[0]))
+
+    def read_raw(self):
+        while True:
+            try:
+                line = super().read_raw()
+                break
+            except OSError as e:
+                self.reconnect(e)
+        if not line:
+            # timed out, whatever was asked is not coming anymore
+            self.in_flight.clear()
+        elif self.in_flight:
+            self.answered(line)
+        return line
+
+    def answered(self, line: bytes):
+        # forgets the oldest in flight query the reply answers, matched on the whole
+        # command except for string values such as *1QMSLSS-ST1 that run on after it
+        m = reply_re.match(line)
+        if not m:
+            return
+        id = int(m[1])
+        letters = m[2].decode().upper()
+        for i, (query_id, command, _) in enumerate(self.in_flight):
+            if query_id == id and reply_answers(letters, command):
+                del self.in_flight[i]
+                if command in LssMetadataCommands:
+                    self.servos.setdefault(id, {})[command] = LssPacket(line.decode()).value
+                return
+
+    def replayable(self, data: bytes, incident: LssBusIncident):
+        # the frames of a failed write that can be sent again, the rest is dropped
+        frames = []
+        for frame in data.split(self.eol):
+            if not frame:
+                continue
+            m = frame_re.match(frame)
+            if m and (m[2] in (b'Q', b'C') or m[3].decode().upper() in LssIdempotentCommands):
+                frames.append(frame + self.eol)
+            else:
+                incident.dropped += 1
+        return b''.join(frames)
+
+    def reconnect(self, error: Exception):
+        # reopens the port after error, returns the incident or raises LssException
+        # when the port did not come back within reconnect_timeout
+        if self.closed:
+            raise error
+        incident = LssBusIncident(error, self.clock())
+        self.incidents.append(incident)
+        self.timeout = self.ser.timeout if hasattr(self.ser, 'timeout') else self.timeout
+        backoff = self.initial_backoff
+        while True:
+            try:
+                self.ser.close()
+            except OSError:
+                pass
+            incident.attempts += 1
+            try:
+                self.ser = self.open_port()
+                self.restore_port(incident)
+                break
+            except OSError as e:
+                # the port is not back yet, or went away again while it was set up
+                if self.clock() - incident.lost + backoff > self.reconnect_timeout:
+                    raise LssException(f'Lost serial port {self.port} and could not reopen it: {e}')
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+        incident.restored = self.clock()
+        return incident
+
+    def restore_port(self, incident: LssBusIncident):
+        # sets up the reopened port and writes the queries in flight again
+        if self.low_latency:
+            self.set_low_latency(True, True)
+        for hook in self.reconnect_hooks:
+            hook(self)
+        pending = [frame for _, _, frame in self.in_flight]
+        if pending:
+            self.ser.write(self.eol.join(pending) + self.eol)
+        incident.replayed = len(pending)
@@ -0,0 +1,98 @@
+import os
+
+
+CONFIG_FILE = 'lss-testing.yml'
+
+# directories searched for the configuration file, %APPDATA%/lynxmotion is added on windows
+CONFIG_PATH_SEARCH = ['~', '~/etc', '/etc/config', '.']
+
+DEFAULT_PORT = '/dev/ttyUSB0'
+DEFAULT_BAUD = 921600
+
+
+def config_search_path():
+    paths = list(CONFIG_PATH_SEARCH)
+    if os.getenv('APPDATA'):
+        paths.append(os.getenv('APPDATA') + '/lynxmotion')
+    return paths
+
+
+def find_config_file(config_basefile: str = CONFIG_FILE):
+    # returns the first config_basefile found on the search path, or None
+    for path_prefix in config_search_path():
+        config_file = os.path.expanduser(os.path.join(path_prefix, config_basefile))
+        if os.path.isfile(config_file):
+            return config_file
+    return None
+
+
+class LssSettings(object):
+    # Port and servo settings, loaded from a yaml file such as lss-testing.yml:
+    #
+    #   port:
+    #       name: /dev/ttyUSB0
+    #       baud: 921600
+    #       low_latency: true
+    #   servos:
+    #       default: [0]
+    #   profiles:
+    #       default:
+    #           AS: 0
+    #
+    # The LSS_PORT and LSS_BAUD environment variables override the file.
+
+    path: str or None
+    port: str
+    baud: int
+    low_latency: bool
+    servos: dict
+    profiles: dict
+
+    def __init__(self, config: dict = None, path: str = None):
+        self.path = path
+        self.port = DEFAULT_PORT
+        self.baud = DEFAULT_BAUD
+        self.low_latency = False
+        self.servos = {'default': [0]}
+        self.profiles = {}
+        if config:
+            if 'port' in config:
+                port = config['port']
+                self.port = port['name'] if 'name' in port else DEFAULT_PORT
+                self.baud = port['baud'] if 'baud' in port else DEFAULT_BAUD
+                self.low_latency = port['low_latency'] if 'low_latency' in port else False
+            if 'servos' in config:
+                self.servos = config['servos']
+            if 'profiles' in config:
+                self.profiles = config['profiles']
+        if os.getenv('LSS_PORT'):
+            self.port = os.getenv('LSS_PORT')
+        if os.getenv('LSS_BAUD'):
+            self.baud = int(os.getenv('LSS_BAUD'))
+
+    def get_servos(self, category: str = 'default'):
+        return self.servos[category] if category in self.servos else self.servos['default']
+
+    def config(self):
+        # the settings as the dict the yaml file would hold
+        return {
+            'port': {'name': self.port, 'baud': self.baud, 'low_latency': self.low_latency},
+            'servos': self.servos,
+            'profiles': self.profiles
+        }
+
+    def open_bus(self):
+        from lss import LssBus
+        return LssBus(self.port, self.baud, low_latency=self.low_latency)
+
+
+def load_settings(path: str = None, config_basefile: str = CONFIG_FILE):
+    # loads the given file, or the first config_basefile on the search path. Without
+    # a file the defaults are used, so yaml is only imported when there is one.
+    if path is None:
+        path = find_config_file(config_basefile)
+    if path is None:
+        return LssSettings()
+    import yaml
+    with open(path) as f:
+        return LssSettings(yaml.safe_load(f), path)
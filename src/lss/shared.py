@@ -0,0 +1,174 @@
+import struct
+import threading
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+from lss import LssPacket, LssException, REPLY
+
+
+# Fixed layout of the shared telemetry table:
+#
+#   header  64 bytes   magic, layout version, servo count
+#   slot    64 bytes   per servo, one cache line each so writers of one servo
+#                      never invalidate the line another servo is read from
+#
+# Every slot starts with a sequence counter used as a seqlock: the writer makes it
+# odd before touching the slot and even again afterwards, readers retry whenever
+# the counter is odd or changed while they were copying the slot.
+
+TELEMETRY_MAGIC = b'LSST'
+TELEMETRY_VERSION = 1
+
+header_struct = struct.Struct('<4sHH')
+slot_struct = struct.Struct('<Qqiiiiii')
+seq_struct = struct.Struct('<Q')
+field_struct = struct.Struct('<i')
+FIELD_MIN = -2 ** 31
+FIELD_MAX = 2 ** 31 - 1
+timestamp_struct = struct.Struct('<q')
+
+HEADER_SIZE = 64
+SLOT_SIZE = 64
+
+# reply command -> (field name, offset of the field within a slot)
+LssTelemetryFields = {
+    'D': ('position', 20),
+    'S': ('speed', 24),
+    'C': ('current', 28),
+    'V': ('voltage', 32),
+    'T': ('temperature', 36)
+}
+
+# how often a reader retries a slot the writer keeps changing before giving up
+MAX_READ_RETRIES = 10000
+
+_attach_lock = threading.Lock()
+
+
+def _attach_untracked(name: str):
+    # Python < 3.13 registers every segment it opens with the resource tracker. A
+    # reader started by multiprocessing shares the owner's tracker, where
+    # unregistering afterwards would drop the owner's registration; a reader with
+    # a tracker of its own would have the segment unlinked when it exits. So the
+    # registration of this one segment is left out instead.
+    register = resource_tracker.register
+
+    def register_others(resource: str, rtype: str):
+        if rtype != 'shared_memory' or resource.lstrip('/') != name.lstrip('/'):
+            register(resource, rtype)
+
+    with _attach_lock:
+        resource_tracker.register = register_others
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+class LssTelemetryState(object):
+
+    id: int
+    sequence: int
+    timestamp: int
+    position: int
+    speed: int
+    current: int
+    voltage: int
+    temperature: int
+
+    def __init__(self, values):
+        seq, self.timestamp, self.id, self.position, self.speed, \
+            self.current, self.voltage, self.temperature = values
+        self.sequence = seq >> 1
+
+
+class LssSharedTelemetry(object):
+    # Latest servo state in shared memory. The process owning the LssBus creates
+    # the table and publishes into it, typically as a bus listener:
+    #
+    #   telemetry = LssSharedTelemetry.create('lss-telemetry', [1, 2, 3])
+    #   bus.add_listener(telemetry.publish)
+    #
+    # and any other process attaches by name and reads without locks or syscalls:
+    #
+    #   telemetry = LssSharedTelemetry.attach('lss-telemetry')
+    #   state = telemetry.read(2)
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, version, count = header_struct.unpack_from(self.buf, 0)
+        if magic != TELEMETRY_MAGIC or version != TELEMETRY_VERSION:
+            raise LssException(f'{shm.name} is not an LSS telemetry table')
+        self.slots = {}
+        for i in range(count):
+            offset = HEADER_SIZE + i * SLOT_SIZE
+            self.slots[slot_struct.unpack_from(self.buf, offset)[2]] = offset
+        self.sequences = {}
+
+    @classmethod
+    def create(cls, name: str, servos):
+        servos = list(servos)
+        shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + len(servos) * SLOT_SIZE)
+        header_struct.pack_into(shm.buf, 0, TELEMETRY_MAGIC, TELEMETRY_VERSION, len(servos))
+        for i, servo in enumerate(servos):
+            slot_struct.pack_into(shm.buf, HEADER_SIZE + i * SLOT_SIZE, 0, 0, servo, 0, 0, 0, 0, 0)
+        return cls(shm, True)
+
+    @classmethod
+    def attach(cls, name: str):
+        # attach from another process than the owner, the owner is responsible for
+        # unlinking so the segment is not registered with the resource tracker
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # python < 3.13
+            shm = _attach_untracked(name)
+        return cls(shm, False)
+
+    @property
+    def servos(self):
+        return list(self.slots.keys())
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def update(self, servo: int, command: str, value: int, timestamp: int = None):
+        # False when the reply has no field in the table, including values that do not
+        # fit its 32 bit fields
+        if command not in LssTelemetryFields or not FIELD_MIN <= value <= FIELD_MAX:
+            return False
+        offset = self.slots.get(servo)
+        if offset is None:
+            return False
+        if timestamp is None:
+            timestamp = time.time_ns()
+        seq = self.sequences.get(servo, 0)
+        buf = self.buf
+        seq_struct.pack_into(buf, offset, seq + 1)
+        timestamp_struct.pack_into(buf, offset + 8, timestamp)
+        field_struct.pack_into(buf, offset + LssTelemetryFields[command][1], value)
+        seq_struct.pack_into(buf, offset, seq + 2)
+        self.sequences[servo] = seq + 2
+        return True
+
+    def publish(self, packet: LssPacket):
+        # bus listener, stores any numeric telemetry reply
+        if packet.direction == REPLY and isinstance(packet.value, int):
+            self.update(packet.id, packet.command, packet.value)
+
+    def read(self, servo: int):
+        offset = self.slots.get(servo)
+        if offset is None:
+            raise LssException(f'Servo {servo} is not in the telemetry table')
+        buf = self.buf
+        for _ in range(MAX_READ_RETRIES):
+            values = slot_struct.unpack_from(buf, offset)
+            seq = values[0]
+            if seq & 1 == 0 and seq_struct.unpack_from(buf, offset)[0] == seq:
+                return LssTelemetryState(values)
+        raise LssException(f'Telemetry of servo {servo} is changing too fast to read')
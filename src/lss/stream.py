@@ -0,0 +1,181 @@
+import time
+
+import numpy as np
+
+from lss import LssBus, LssException
+
+
+DEFAULT_RATE = 100.0
+
+
+class LssStreamReport(object):
+
+    ticks: int
+    sent: int
+    dropped: int
+    duration: float
+    rate: float
+    max_lateness: float
+
+    def __init__(self, ticks: int, sent: int, dropped: int, duration: float, max_lateness: float):
+        self.ticks = ticks
+        self.sent = sent
+        self.dropped = dropped
+        self.duration = duration
+        self.rate = sent / duration if duration > 0 else 0.0
+        self.max_lateness = max_lateness
+
+    def __repr__(self):
+        return 'LssStreamReport({} of {} ticks sent, {} dropped, {:.1f}Hz, {:.2f}ms max late)'.format(
+            self.sent, self.ticks, self.dropped, self.rate, self.max_lateness * 1000)
+
+
+def slew_limit(positions, step: float, fast=None):
+    # the positions of one servo moving at most step per tick, the same as
+    #
+    #   limited[n] = limited[n - 1] + np.clip(positions[n] - limited[n - 1], -step, step)
+    #
+    # but computed a run of ticks at a time. Within reach the servo follows the
+    # trajectory up to the next tick of `fast` (the ticks that move more than step),
+    # out of reach it ramps at step per tick until the trajectory is within reach
+    # again, which is searched for in windows of growing size.
+    positions = np.asarray(positions, dtype=float)
+    if fast is None:
+        fast = np.flatnonzero(np.abs(np.diff(positions)) > step) + 1
+    limited = positions.copy()
+    total = len(positions)
+    previous = positions[0] if total else 0.0
+    n = 1
+    while n < total:
+        offset = positions[n] - previous
+        if abs(offset) <= step:
+            i = np.searchsorted(fast, n, 'right')
+            end = fast[i] if i < len(fast) else total
+        else:
+            # ramping ends at the first tick the trajectory is no further ahead of
+            # the servo than step, it may have turned around by then
+            direction = 1.0 if offset > 0 else -1.0
+            start, window = n, 16
+            while True:
+                stop = min(start + window, total)
+                behind = previous + direction * step * np.arange(start - n, stop - n)
+                reached = np.flatnonzero(direction * (positions[start:stop] - behind) <= step)
+                if reached.size or stop == total:
+                    end = start + reached[0] if reached.size else total
+                    break
+                start, window = stop, window * 2
+            limited[n:end] = previous + direction * step * np.arange(1, end - n + 1)
+        previous = limited[end - 1]
+        n = end
+    return limited
+
+
+class LssTrajectoryStream(object):
+    # Streams joint trajectories to a set of servos. A trajectory is sampled at
+    # arbitrary times as a (time x servo) array of positions in tenths of degrees;
+    # prepare() resamples it to the tick rate, applies the LN/LP limits and SD speed
+    # caps and encodes every tick's D commands into one contiguous buffer, so play()
+    # only has to hand slices of that buffer to the bus on time.
+
+    def __init__(self, bus: LssBus, servos, rate: float = DEFAULT_RATE,
+                 lower=None, upper=None, max_speed=None):
+        # lower/upper are position limits and max_speed the speed cap in tenths of
+        # degrees per second, each a scalar or one value per servo
+        if rate <= 0:
+            raise LssException('Stream rate must be positive')
+        self.bus = bus
+        self.servos = list(servos)
+        self.rate = rate
+        n = len(self.servos)
+        self.lower = np.broadcast_to(np.asarray(-np.inf if lower is None else lower, dtype=float), (n,))
+        self.upper = np.broadcast_to(np.asarray(np.inf if upper is None else upper, dtype=float), (n,))
+        self.max_speed = np.broadcast_to(np.asarray(np.inf if max_speed is None else max_speed, dtype=float), (n,))
+        self.positions = None
+        self.buffer = b''
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def from_configs(cls, bus: LssBus, configs: dict, rate: float = DEFAULT_RATE):
+        # takes limits and speed caps from a lss.config snapshot, servo -> LssServoConfig
+        servos = list(configs.keys())
+
+        def column(attribute, missing):
+            return [missing if getattr(configs[s], attribute) is None else getattr(configs[s], attribute)
+                    for s in servos]
+
+        return cls(bus, servos, rate,
+                   lower=column('negative_limit', -np.inf),
+                   upper=column('positive_limit', np.inf),
+                   max_speed=column('max_speed', np.inf))
+
+    @property
+    def ticks(self):
+        return len(self.offsets) - 1
+
+    def resample(self, times, positions):
+        # linear interpolation of every servo onto the tick times in one pass
+        times = np.asarray(times, dtype=float)
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim != 2 or positions.shape != (len(times), len(self.servos)):
+            raise LssException('Positions must be a (time x servo) array matching the servos')
+        if len(times) < 2 or np.any(np.diff(times) <= 0):
+            raise LssException('Times must be increasing with at least two samples')
+        ticks = times[0] + np.arange(int(np.floor((times[-1] - times[0]) * self.rate + 1e-9)) + 1) / self.rate
+        i = np.clip(np.searchsorted(times, ticks, side='right') - 1, 0, len(times) - 2)
+        fraction = ((ticks - times[i]) / (times[i + 1] - times[i]))[:, None]
+        return positions[i] + fraction * (positions[i + 1] - positions[i])
+
+    def limit(self, positions):
+        positions = np.clip(positions, self.lower, self.upper)
+        step = self.max_speed / self.rate
+        fast = np.abs(np.diff(positions, axis=0)) > step
+        if not fast.any():
+            return positions
+        # some tick moves faster than allowed, follow the trajectory at the capped
+        # speed and catch up once it slows down, only the servos that are too fast
+        limited = positions.copy()
+        for column in np.flatnonzero(fast.any(axis=0)):
+            fast_ticks = np.flatnonzero(fast[:, column]) + 1
+            limited[:, column] = slew_limit(positions[:, column], step[column], fast_ticks)
+        return limited
+
+    def encode(self, positions):
+        values = np.rint(positions).astype(np.int64)
+        prefixes = np.array([f'#{servo}D' for servo in self.servos])
+        frames = np.char.add(np.char.add(prefixes, np.char.mod('%d', values)), self.bus.eol.decode())
+        ticks = [''.join(row).encode('utf8') for row in frames]
+        self.buffer = b''.join(ticks)
+        self.offsets = np.zeros(len(ticks) + 1, dtype=np.int64)
+        np.cumsum([len(tick) for tick in ticks], out=self.offsets[1:])
+        self.positions = values
+
+    def prepare(self, times, positions):
+        self.encode(self.limit(self.resample(times, positions)))
+        return self.positions
+
+    def play(self, clock=time.perf_counter, sleep=time.sleep):
+        # writes one tick per period against a deadline clock. A tick whose successor
+        # is already due is dropped rather than sent late, except the last one which
+        # holds the final position.
+        if self.ticks == 0:
+            raise LssException('Nothing to play, call prepare() first')
+        period = 1.0 / self.rate
+        buffer, offsets = self.buffer, self.offsets.tolist()
+        last = self.ticks - 1
+        sent = dropped = 0
+        max_lateness = 0.0
+        start = clock()
+        for n in range(self.ticks):
+            deadline = start + n * period
+            now = clock()
+            if now < deadline:
+                sleep(deadline - now)
+            else:
+                lateness = now - deadline
+                if lateness >= period and n < last:
+                    dropped += 1
+                    continue
+                max_lateness = max(max_lateness, lateness)
+            self.bus.write_raw(buffer[offsets[n]:offsets[n + 1]])
+            sent += 1
+        return LssStreamReport(self.ticks, sent, dropped, clock() - start, max_lateness)
@@ -0,0 +1,313 @@
+import collections
+import threading
+import time
+
+from lss import LssBus, LssPacket, LssException, REPLY
+
+
+class LssUpdate(object):
+
+    servo: int
+    parameter: str
+    value: int or str
+    time: float
+
+    def __init__(self, packet: LssPacket, t: float):
+        self.servo = packet.id
+        self.parameter = packet.command
+        self.value = packet.value
+        self.time = t
+        self.packet = packet
+
+    def __repr__(self):
+        return f'LssUpdate({self.servo} {self.parameter} {self.value} @ {self.time:.3f})'
+
+
+class LssLatestQueue(object):
+    # A bounded queue for one consumer. When the consumer falls behind, put() drops
+    # the oldest update instead of blocking, so the reader is never stalled and the
+    # consumer always finds the most recent values. Usable from threads with get()
+    # and from asyncio with `await queue.get_async()` or `async for`.
+
+    maxsize: int
+    dropped: int
+
+    def __init__(self, maxsize: int = 1):
+        if maxsize <= 0:
+            raise LssException('Queue size must be positive')
+        self.maxsize = maxsize
+        self.items = collections.deque(maxlen=maxsize)
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.waiters = []   # (loop, future) of async consumers
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.maxsize:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+            self._wake_async()
+
+    def close(self):
+        # wakes all consumers, get() raises EOFError once the queue is drained
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            self._wake_async()
+
+    def _wake_async(self):
+        waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def get_nowait(self):
+        with self.condition:
+            if self.items:
+                return self.items.popleft()
+            if self.closed:
+                raise EOFError('subscription closed')
+            return None
+
+    def get(self, timeout: float = None):
+        # the oldest update, None on timeout
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            if self.items:
+                return self.items.popleft()
+            raise EOFError('subscription closed')
+
+    async def get_async(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.items:
+                    return self.items.popleft()
+                if self.closed:
+                    raise EOFError('subscription closed')
+                future = loop.create_future()
+                self.waiters.append((loop, future))
+            await future
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.get_async()
+        except EOFError:
+            raise StopAsyncIteration
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LssSubscription(object):
+    # One consumer of the replies of a servo parameter. An update is delivered when
+    # the value moved more than deadband away from the last delivered value and at
+    # least min_interval seconds passed since then; the first value always is.
+    # Updates go to the callback when one is given, otherwise to a LssLatestQueue.
+
+    servo: int or None
+    parameter: str
+    deadband: float
+    min_interval: float
+    delivered: int
+    filtered: int
+    errors: int
+
+    def __init__(self, servo: int or None, parameter: str, callback=None, deadband: float = 0,
+                 min_interval: float = 0, maxsize: int = 1):
+        self.servo = servo
+        self.parameter = parameter
+        self.callback = callback
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.queue = None if callback else LssLatestQueue(maxsize)
+        self.last = {}      # servo -> (time, value) last delivered
+        self.delivered = 0
+        self.filtered = 0
+        self.errors = 0
+        self.error = None   # the last exception raised by the callback
+        self.hub = None
+
+    def accept(self, packet: LssPacket, t: float):
+        last = self.last.get(packet.id)
+        if last is not None:
+            last_time, last_value = last
+            if t - last_time < self.min_interval:
+                return False
+            if isinstance(packet.value, int) and isinstance(last_value, int):
+                if abs(packet.value - last_value) <= self.deadband:
+                    return False
+            elif packet.value == last_value:
+                return False
+        self.last[packet.id] = (t, packet.value)
+        return True
+
+    def offer(self, packet: LssPacket, t: float):
+        if not self.accept(packet, t):
+            self.filtered += 1
+            return
+        self.delivered += 1
+        update = LssUpdate(packet, t)
+        if self.callback:
+            try:
+                self.callback(update)
+            except Exception as e:
+                # a failing subscriber must not stop the reader or the other subscribers
+                self.errors += 1
+                self.error = e
+        else:
+            self.queue.put(update)
+
+    @property
+    def dropped(self):
+        return self.queue.dropped if self.queue is not None else 0
+
+    def get(self, timeout: float = None):
+        return self.queue.get(timeout)
+
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    def __aiter__(self):
+        return self.queue.__aiter__()
+
+    def close(self):
+        if self.hub:
+            self.hub.unsubscribe(self)
+
+
+class LssSubscriptions(object):
+    # Pushes replies read from the bus to subscribers, so consumers wait for changes
+    # instead of polling:
+    #
+    #   subscriptions = LssSubscriptions(bus)
+    #   position = subscriptions.subscribe(1, 'D', deadband=5, min_interval=0.05)
+    #   current = subscriptions.subscribe(1, 'C', callback=log_current)
+    #   subscriptions.start([(1, 'QD'), (1, 'QC')], rate=100)
+    #   update = position.get()
+    #
+    # Filtering happens on the reading thread, a subscriber that ignores a change
+    # costs a dict lookup and a comparison, and is never woken.
+
+    def __init__(self, bus: LssBus, clock=time.monotonic):
+        self.bus = bus
+        self.clock = clock
+        self.subscriptions = {}     # (servo, parameter) -> [LssSubscription], servo None for all
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.cycles = 0
+        self.garbled = 0
+        self.error = None   # what stopped the background poller
+        bus.add_listener(self.dispatch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def subscribe(self, servo: int or None, parameter: str, callback=None, deadband: float = 0,
+                  min_interval: float = 0, maxsize: int = 1):
+        # servo None subscribes to the parameter of every servo
+        subscription = LssSubscription(servo, parameter, callback, deadband, min_interval, maxsize)
+        subscription.hub = self
+        with self.lock:
+            key = (servo, parameter)
+            self.subscriptions[key] = self.subscriptions.get(key, []) + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: LssSubscription):
+        with self.lock:
+            key = (subscription.servo, subscription.parameter)
+            remaining = [s for s in self.subscriptions.get(key, []) if s is not subscription]
+            if remaining:
+                self.subscriptions[key] = remaining
+            else:
+                self.subscriptions.pop(key, None)
+        subscription.hub = None
+        if subscription.queue is not None:
+            subscription.queue.close()
+
+    def dispatch(self, packet: LssPacket):
+        # bus listener; the subscriber lists are replaced, never changed, so they are
+        # iterated without holding the lock
+        if packet.direction != REPLY:
+            return
+        exact = self.subscriptions.get((packet.id, packet.command))
+        wildcard = self.subscriptions.get((None, packet.command))
+        if exact is None and wildcard is None:
+            return
+        t = self.clock()
+        for subscription in exact or ():
+            subscription.offer(packet, t)
+        for subscription in wildcard or ():
+            subscription.offer(packet, t)
+
+    def poll(self, queries):
+        # writes the queries, (id, command) pairs, in one burst and reads the replies,
+        # a garbled reply is skipped and the rest are still read
+        self.bus.write_commands(queries)
+        for _ in queries:
+            try:
+                self.bus.read()
+            except TimeoutError:
+                break
+            except (LssException, UnicodeDecodeError):
+                self.garbled += 1
+        self.cycles += 1
+
+    def start(self, queries, rate: float):
+        # polls the queries at rate in a background thread
+        if rate <= 0:
+            raise LssException('Poll rate must be positive')
+        queries = list(queries)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(queries, 1.0 / rate), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        self.bus.remove_listener(self.dispatch)
+        for subscriptions in list(self.subscriptions.values()):
+            for subscription in subscriptions:
+                self.unsubscribe(subscription)
+
+    def _run(self, queries, period: float):
+        try:
+            next_time = time.perf_counter()
+            while self.running:
+                self.poll(queries)
+                next_time += period
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # fell behind, don't try to catch up with a burst of polls
+                    next_time = time.perf_counter()
+        except Exception as e:
+            # the bus failed, consumers get EOFError instead of waiting for updates
+            # that will never come
+            self.error = e
+            self.running = False
+            for subscriptions in list(self.subscriptions.values()):
+                for subscription in subscriptions:
+                    if subscription.queue is not None:
+                        subscription.queue.close()
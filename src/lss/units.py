@@ -0,0 +1,77 @@
+import numpy as np
+
+from lss import LssException, LssCommandUnits
+
+
+def unit_of(command: str):
+    unit = LssCommandUnits.get(command)
+    if unit is None:
+        raise LssException(f'Command {command} has no unit')
+    return unit
+
+
+def to_si(command: str, values):
+    # raw values of one command to SI units, as float64
+    unit = unit_of(command)
+    return np.asarray(values, dtype=np.float64) * unit.scale + unit.offset
+
+
+def from_si(command: str, values, clip: bool = True):
+    # SI values to raw integers, clipped to the valid range of the command
+    unit = unit_of(command)
+    raw = np.rint((np.asarray(values, dtype=np.float64) - unit.offset) / unit.scale)
+    if clip:
+        lower = unit.minimum if unit.minimum is not None else (None if unit.signed else 0)
+        if lower is not None or unit.maximum is not None:
+            raw = np.clip(raw, lower, unit.maximum)
+    return raw.astype(np.int64)
+
+
+def valid(command: str, values):
+    # boolean mask of the raw values within the valid range of the command
+    unit = unit_of(command)
+    values = np.asarray(values)
+    mask = np.ones(values.shape, dtype=bool)
+    if not unit.signed:
+        mask &= values >= 0
+    if unit.minimum is not None:
+        mask &= values >= unit.minimum
+    if unit.maximum is not None:
+        mask &= values <= unit.maximum
+    return mask
+
+
+def _unit_tables(commands, *attributes):
+    # the attributes of the unit of every entry of an array of commands, NaN for
+    # commands without a unit, looking the commands up only once for all attributes
+    commands = np.asarray(commands)
+    unique, inverse = np.unique(commands, return_inverse=True)
+    inverse = inverse.reshape(commands.shape)
+    units = [LssCommandUnits.get(c) for c in unique.tolist()]
+    return [np.array([np.nan if unit is None else getattr(unit, attribute) for unit in units])[inverse]
+            for attribute in attributes]
+
+
+def scales(commands):
+    # scale of every entry of an array of commands, NaN for commands without a unit
+    return _unit_tables(commands, 'scale')[0]
+
+
+def offsets(commands):
+    # offset of every entry of an array of commands, NaN for commands without a unit
+    return _unit_tables(commands, 'offset')[0]
+
+
+def mixed_to_si(commands, values):
+    # converts samples of different commands at once, commands and values being
+    # arrays of the same shape; samples of commands without a unit become NaN
+    scale, offset = _unit_tables(commands, 'scale', 'offset')
+    return np.asarray(values, dtype=np.float64) * scale + offset
+
+
+def packets_to_si(packets):
+    # SI values of a sequence of LssPackets, NaN where a packet has no numeric value or unit
+    packets = list(packets)
+    commands = [p.command for p in packets]
+    values = np.array([p.value if isinstance(p.value, int) else np.nan for p in packets], dtype=np.float64)
+    return mixed_to_si(commands, values)
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from lss.benchmark import LssBenchmark, LssBenchmarkResult, run, compare, percentile, main, \
+    make_benchmarks, parse_reply, load_report, merge_reports, DEFAULT_BASELINE
+
+
+def report_with(**relative):
+    return {'benchmarks': {name: {'relative': value, 'percentiles': {'p50': value * 1e-7}}
+                           for name, value in relative.items()}}
+
+
+class LssBenchmarkTests(unittest.TestCase):
+    def test_percentile(self):
+        values = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.assertEqual(percentile(values, 50), 3.0)
+        self.assertEqual(percentile(values, 90), 4.6)
+        self.assertEqual(percentile([7.0], 99), 7.0)
+
+    def test_result_relative_is_median_ratio(self):
+        result = LssBenchmarkResult('x', 'micro', [2e-6, 4e-6, 3e-6], 10, [1e-8, 2e-8, 1e-8])
+        self.assertAlmostEqual(result.relative, 200.0)
+        self.assertEqual(result.median, 3e-6)
+        self.assertEqual(set(result.to_dict()['percentiles']), {'p50', 'p90', 'p99'})
+
+    def test_report(self):
+        report = run(scale=0.02, repeat=1)
+        json.dumps(report)
+        self.assertIn('python', report['environment'])
+        names = {benchmark.name for benchmark in make_benchmarks()}
+        self.assertEqual(set(report['benchmarks']), names)
+        for result in report['benchmarks'].values():
+            self.assertGreater(result['percentiles']['p50'], 0)
+            self.assertLessEqual(result['percentiles']['p50'], result['percentiles']['p99'])
+            self.assertGreater(result['relative'], 0)
+
+    def test_compare(self):
+        baseline = report_with(parse=40.0, read=100.0, removed=5.0)
+        comparisons = {c.name: c for c in compare(report_with(parse=70.0, read=90.0, added=1.0), baseline, 0.5)}
+        self.assertEqual(set(comparisons), {'parse', 'read'})
+        self.assertTrue(comparisons['parse'].regressed)
+        self.assertFalse(comparisons['read'].regressed)
+
+    def test_merge_takes_the_median_run(self):
+        merged = merge_reports([report_with(parse=40.0, read=100.0), report_with(parse=20.0, read=110.0),
+                                report_with(parse=41.0, read=90.0)])
+        self.assertEqual({name: entry['relative'] for name, entry in merged['benchmarks'].items()},
+                         {'parse': 40.0, 'read': 100.0})
+
+    def test_gate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            select = ['--only', 'parse_reply', '--scale', '0.05', '--repeat', '1', '--baseline', path]
+            self.assertEqual(main(select + ['--save-baseline']), 0)
+            self.assertEqual(main(select), 0)
+            baseline = load_report(path)
+            baseline['benchmarks']['parse_reply']['relative'] /= 10
+            with open(path, 'w') as f:
+                json.dump(baseline, f)
+            self.assertEqual(main(select), 1)
+
+    def test_missing_baseline_fails(self):
+        with tempfile.TemporaryDirectory() as directory:
+            select = ['--only', 'parse_reply', '--scale', '0.05', '--repeat', '1',
+                      '--baseline', os.path.join(directory, 'missing.json')]
+            self.assertEqual(main(select), 2)
+            self.assertEqual(main(select + ['--allow-missing-baseline']), 0)
+
+    def test_baseline_covers_benchmarks(self):
+        # a benchmark added without refreshing the baseline would never be gated
+        self.assertTrue(os.path.isabs(DEFAULT_BASELINE))
+        baseline = load_report(DEFAULT_BASELINE)
+        self.assertEqual(set(baseline['benchmarks']), {benchmark.name for benchmark in make_benchmarks()})
+
+    def test_custom_benchmark(self):
+        report = run([LssBenchmark('parse', 'micro', parse_reply, 10, 5)], repeat=2)
+        self.assertEqual(report['benchmarks']['parse']['rounds'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
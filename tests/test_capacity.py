@@ -0,0 +1,72 @@
+import time
+import unittest
+
+from lss import LssBus, LssException
+from lss.benchmark import model_check
+from lss.capacity import LssBusCapacity
+from lss.emulator import LssEmulator, LssEmulatedServo
+
+
+class LssCapacityTests(unittest.TestCase):
+    def test_frame_lengths(self):
+        capacity = LssBusCapacity(115200)
+        self.assertEqual(capacity.request_length(12, 'D'), len('#12QD\r'))
+        self.assertEqual(capacity.reply_length(12, 'D'), len('*12QD-1800\r'))
+        self.assertEqual(capacity.request_length(3, 'D', False, 900), len('#3D900\r'))
+
+    def test_pipelined_cycle_is_faster(self):
+        capacity = LssBusCapacity(921600)
+        servos = range(1, 7)
+        self.assertGreater(
+            capacity.max_cycle_rate(servos, ['D', 'S', 'C'], pipelined=True),
+            capacity.max_cycle_rate(servos, ['D', 'S', 'C']))
+
+    def test_admit_and_rescale(self):
+        capacity = LssBusCapacity(115200)
+        schedule = [(servo, 'D', 200) for servo in range(1, 13)]
+        with self.assertRaises(LssException):
+            capacity.admit(schedule, 0.5)
+        rescaled = capacity.rescale(schedule, 0.5)
+        self.assertAlmostEqual(capacity.utilisation(rescaled), 0.5)
+        capacity.admit(rescaled, 0.51)
+        self.assertEqual(capacity.rescale(rescaled, 0.9), rescaled)
+
+    def test_pipelined_admission(self):
+        capacity = LssBusCapacity(921600)
+        schedule = [(servo, command, 100) for servo in range(1, 7) for command in ('D', 'C')]
+        with self.assertRaises(LssException):
+            capacity.admit(schedule)
+        load = capacity.admit(schedule, pipelined=True)
+        # a schedule polled at one rate is a cycle of all its queries per period
+        self.assertAlmostEqual(load, 100 * capacity.cycle_time(range(1, 7), ['D', 'C'], pipelined=True))
+        rescaled = capacity.rescale(schedule, 0.3, pipelined=True)
+        self.assertAlmostEqual(capacity.utilisation(rescaled, pipelined=True), 0.3)
+
+    def test_emulator_paces_like_the_model(self):
+        # a consistency check of the emulator, which paces replies with the same wire
+        # time formula; test_model_matches_measured_round_trips checks the model itself
+        baud = 19200
+        count = 30
+        capacity = LssBusCapacity(baud, turnaround=0.0, host_latency=0.0)
+        with LssEmulator([LssEmulatedServo(1, D=-1800)], baud=baud) as emulator:
+            bus = LssBus(emulator.port, baud, low_latency=False)
+            start_time = time.perf_counter()
+            for _ in range(count):
+                bus.write_command(1, 'QD')
+                bus.read()
+            measured = count / (time.perf_counter() - start_time)
+            bus.close()
+        predicted = 1.0 / capacity.query_time(1, 'D')
+        self.assertLess(abs(measured - predicted) / predicted, 0.2)
+
+    def test_shipped_model_against_measured_cycles(self):
+        # the model with its default turnaround and host latency must not promise more
+        # than the emulated bus delivers, and a burst of 6, mostly wire time at 115200
+        # baud, must come close
+        model = model_check(cycles=30)
+        self.assertEqual(model['optimistic'], [], model['cycles'])
+        self.assertGreater(model['cycles']['pipelined_6']['error'], -0.35)
+
+
+if __name__ == '__main__':
+    unittest.main()
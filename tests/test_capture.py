@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from lss import LssBus
+from lss.capture import LssCaptureRecorder, LssCaptureReader, LssReplaySerial
+from lss.emulator import LssEmulator, LssEmulatedServo
+
+
+class LssCaptureTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'bus.lsscap')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_record_bus_traffic(self):
+        with LssEmulator([LssEmulatedServo(1, D=-120), 2]) as emulator:
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            bus.recorder = LssCaptureRecorder(self.path)
+            bus.write_commands([(1, 'QD'), (2, 'QMS')])
+            bus.read()
+            bus.read()
+            bus.write_command(2, 'D300')
+            bus.recorder.close()
+            bus.close()
+
+        with LssCaptureReader(self.path) as reader:
+            self.assertEqual(len(reader), 5)
+            self.assertEqual(reader[0].payload, b'#1QD')
+            self.assertEqual(reader[2].value, -120)
+            self.assertEqual(reader[3].payload, b'*2QMSLSS-ST1')
+            self.assertEqual([r.value for r in reader.select(servo=2, command='D')], [300])
+            self.assertEqual(len(reader.select(servo=1)), 2)
+            self.assertEqual(len(reader.window(reader[2].timestamp)), 3)
+
+    def test_replay_into_bus(self):
+        with LssCaptureRecorder(self.path) as recorder:
+            for n in range(10):
+                recorder.record_write(b'#5QD\r')
+                recorder.record_read(f'*5QD{n * 10}'.encode())
+        with LssCaptureReader(self.path) as reader:
+            bus = LssBus(LssReplaySerial(reader, speed=0), 921600, low_latency=False)
+            self.assertEqual([bus.read().value for _ in range(10)], [n * 10 for n in range(10)])
+            with self.assertRaises(TimeoutError):
+                bus.read()
+            bus.close()
+
+    def test_wall_clock_step(self):
+        # an NTP step back an hour mid-capture must not reorder the records
+        wall = time.time_ns()
+        with LssCaptureRecorder(self.path) as recorder:
+            recorder.record_write(b'#5QD\r')
+            with mock.patch('time.time_ns', return_value=wall - 3600 * 10**9):
+                recorder.record_write(b'#5QD\r')
+        with LssCaptureRecorder(self.path) as recorder:
+            recorder.record_write(b'#5QD\r')
+        with LssCaptureReader(self.path) as reader:
+            timestamps = [record.timestamp for record in reader]
+            self.assertEqual(timestamps, sorted(timestamps))
+            self.assertGreaterEqual(timestamps[0], reader.started)
+            self.assertEqual(len(reader.window(timestamps[1])), 2)
+
+    def test_append_after_reboot(self):
+        with LssCaptureRecorder(self.path) as recorder:
+            recorder.record_write(b'#5QD\r')
+        # the monotonic clock starts over after a reboot
+        with mock.patch('time.monotonic_ns', side_effect=iter(range(10**9, 2 * 10**9, 1000)).__next__):
+            with LssCaptureRecorder(self.path) as recorder:
+                recorder.record_write(b'#5QD\r')
+                recorder.record_write(b'#5QD\r')
+        with LssCaptureReader(self.path) as reader:
+            timestamps = [record.timestamp for record in reader]
+            self.assertEqual(len(timestamps), 3)
+            self.assertEqual(timestamps, sorted(timestamps))
+
+
+if __name__ == '__main__':
+    unittest.main()
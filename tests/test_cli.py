@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import lss
+from lss.cli import main
+from lss.emulator import LssEmulator, LssEmulatedServo
+
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(lss.__file__)))
+
+# seconds `lss` may add to the start of a bare interpreter before running a command
+COLD_START_BUDGET = 0.1
+
+
+def run_python(code: str, env: dict):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+class LssCliTests(unittest.TestCase):
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = main(list(argv))
+        return code, out.getvalue()
+
+    def test_lean_import(self):
+        env = dict(os.environ, PYTHONPATH=SRC)
+        _, imported = run_python(
+            'import sys, lss, lss.cli; lss.cli.make_parser(); '
+            'print(sorted(m for m in ("serial", "yaml", "numpy", "unittest") if m in sys.modules))', env)
+        self.assertEqual(imported.strip(), '[]')
+
+    def test_cold_start(self):
+        with tempfile.TemporaryDirectory() as pycache:
+            # measure with bytecode cached, like an installed package
+            env = dict(os.environ, PYTHONPATH=SRC, PYTHONPYCACHEPREFIX=pycache)
+            env.pop('PYTHONDONTWRITEBYTECODE', None)
+            code = 'import lss.cli; lss.cli.make_parser()'
+            run_python(code, env)
+            bare = min(run_python('pass', env)[0] for _ in range(5))
+            cold = min(run_python(code, env)[0] for _ in range(5))
+        self.assertLess(cold - bare, COLD_START_BUDGET)
+
+    def test_query_and_set(self):
+        with LssEmulator([LssEmulatedServo(3, V=11500)]) as emulator:
+            code, out = self.run_cli('--port', emulator.port, '--no-low-latency', 'set', '3', 'D450')
+            self.assertEqual(code, 0)
+            code, out = self.run_cli('--port', emulator.port, '--no-low-latency', 'query', '3', 'D', 'V')
+            self.assertEqual(code, 0)
+            self.assertEqual(out.splitlines(), ['3 D 450', '3 V 11500'])
+
+    def test_unanswered_parameter(self):
+        with LssEmulator([LssEmulatedServo(1, D=450)]) as emulator:
+            base = ['--port', emulator.port, '--no-low-latency', '--timeout', '0.1']
+            code, out = self.run_cli(*base, 'query', '1', 'TQX', 'D')
+            self.assertEqual(code, 1)
+            self.assertEqual(out, '')
+            code, out = self.run_cli(*base, 'query', '1', 'D', 'TQX')
+            self.assertEqual((code, out), (1, '1 D 450\n'))
+            code, out = self.run_cli(*base, 'monitor', '1', '-p', 'TQX,D,V', '--count', '1')
+            self.assertEqual(code, 0)
+            self.assertTrue(out.rstrip().endswith(' 1:-,450,11900'), out)
+
+    def test_scan(self):
+        with LssEmulator([2, 5]) as emulator:
+            code, out = self.run_cli('--port', emulator.port, '--no-low-latency', 'scan', '--last', '6')
+        self.assertEqual(code, 0)
+        self.assertEqual(out.splitlines(), ['2 LSS-ST1', '5 LSS-ST1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from lss import LssBus, LssException
+from lss.config import LssServoConfig, LssConfigRegisters, snapshot, provision, profiles_from_config
+from lss.emulator import LssEmulator, LssEmulatedServo
+
+
+class LssConfigTests(unittest.TestCase):
+    def test_diff(self):
+        current = LssServoConfig(1, {'AS': 0, 'AH': 4, 'LN': -1800})
+        self.assertEqual(current.diff({'AS': 0, 'holding_stiffness': 2, 'LN': -900}), {'AH': 2, 'LN': -900})
+        with self.assertRaises(LssException):
+            current.diff({'XX': 1})
+
+    def test_profiles_from_config(self):
+        config = {'profiles': {'default': {'AS': 2, 'AH': 4}, 3: {'AS': -1}}}
+        self.assertEqual(profiles_from_config(config, [1, 3]), {1: {'AS': 2, 'AH': 4}, 3: {'AS': -1, 'AH': 4}})
+
+    def test_provision_fleet(self):
+        servos = [LssEmulatedServo(1), LssEmulatedServo(2, AS=2, G=-1), LssEmulatedServo(3, LP=900)]
+        with LssEmulator(servos) as emulator:
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            bus.ser.timeout = 0.2
+            configs = snapshot(bus, [1, 2, 3])
+            self.assertEqual(configs[2].angular_stiffness, 2)
+            self.assertEqual(configs[3]['LP'], 900)
+
+            profile = {'AS': 0, 'G': 1, 'LP': 1800, 'AA': 100}
+            changes = provision(bus, {1: profile, 2: profile, 3: profile})
+            self.assertEqual(changes, {2: {'AS': 0, 'G': 1}, 3: {'LP': 1800}})
+            for servo in (1, 2, 3):
+                self.assertEqual(snapshot(bus, [servo])[servo].diff(profile), {})
+
+            requests = emulator.requests
+            self.assertEqual(provision(bus, {1: profile, 2: profile, 3: profile}), {})
+            # an up to date fleet costs only the snapshot queries
+            self.assertEqual(emulator.requests - requests, 3 * len(LssConfigRegisters))
+            bus.close()
+
+
+    def test_persisted_writes_apply_now_and_after_reset(self):
+        # gyre and origin config writes only take effect at a reset on the servo
+        servo = LssEmulatedServo(1, G=-1, O=0, AS=2)
+        profile = {'G': 1, 'O': 50, 'AS': 0}
+        with LssEmulator([servo]) as emulator:
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            bus.ser.timeout = 0.2
+            self.assertEqual(provision(bus, {1: profile}), {1: profile})
+            self.assertEqual(servo.config, profile)
+            servo.reset()
+            self.assertEqual(provision(bus, {1: profile}), {})
+            self.assertEqual(provision(bus, {1: {'AS': 3}}, persist=False), {1: {'AS': 3}})
+            self.assertEqual(servo.config['AS'], 0)
+            bus.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
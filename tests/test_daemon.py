@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from lss import LssBus, LssException
+from lss.daemon import LssDaemon, LssClient, encode_frame, MSG_WRITE, MSG_BAUD, MSG_REPLY, \
+    MSG_TIMEOUT
+from lss.emulator import LssEmulator, LssEmulatedServo
+
+
+class LssDaemonTests(unittest.TestCase):
+    def setUp(self):
+        self.emulator = LssEmulator([1, 2, 3, LssEmulatedServo(4, D='12ab')])
+        self.emulator.start()
+        self.bus = LssBus(self.emulator.port, 921600, low_latency=False)
+        self.bus.ser.timeout = 0.2
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.daemon = LssDaemon([self.bus], os.path.join(self.tmpdir.name, 'lss.sock'))
+        self.daemon.start()
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.bus.close()
+        self.emulator.stop()
+        self.tmpdir.cleanup()
+
+    def test_query_and_write(self):
+        client = LssClient(self.daemon.path)
+        client.write_command(2, 'D450')
+        client.write_command(2, 'QD')
+        p = client.read()
+        self.assertEqual((p.id, p.command, p.value), (2, 'D', 450))
+        client.close()
+
+    def test_missing_servo_times_out(self):
+        client = LssClient(self.daemon.path)
+        client.write_commands([(9, 'QD'), (3, 'QV')])
+        with self.assertRaises(TimeoutError):
+            client.read()
+        self.assertEqual(client.read().value, 11900)
+        client.close()
+
+    def test_many_clients_are_batched(self):
+        count = 50
+        results = {}
+
+        def run(servo):
+            client = LssClient(self.daemon.path)
+            values = []
+            for n in range(count):
+                client.write_commands([(servo, f'D{n}'), (servo, 'QD')])
+                values.append(client.read().value)
+            results[servo] = values
+            client.close()
+
+        threads = [threading.Thread(target=run, args=(servo,)) for servo in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for servo in (1, 2, 3):
+            self.assertEqual(results[servo], list(range(count)))
+        self.assertEqual(self.daemon.requests, 3 * 2 * count)
+        self.assertLess(self.daemon.batches, self.daemon.requests)
+
+    def test_clients_release_their_sockets(self):
+        def open_fds():
+            return len(os.listdir('/proc/self/fd'))
+
+        client = LssClient(self.daemon.path)
+        client.write_command(1, 'QD')
+        client.read()
+        client.close()
+        before = open_fds()
+        for _ in range(50):
+            client = LssClient(self.daemon.path)
+            client.write_command(1, 'QD')
+            client.read()
+            client.close()
+        # the daemon notices the last close asynchronously
+        for _ in range(100):
+            if not self.daemon.connections:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.daemon.connections, [])
+        self.assertEqual(len(self.daemon.threads), 2)
+        self.assertLessEqual(open_fds(), before)
+
+    def test_bad_requests_keep_the_bus_running(self):
+        bad = LssClient(self.daemon.path)
+        for kind, payload in ((MSG_WRITE, b'#1\xffQD'), (MSG_WRITE, b'garbage'), (MSG_WRITE, b'#1QD\r#2QD'),
+                              (MSG_BAUD, b'\x01')):
+            bad.sock.sendall(encode_frame(kind, 0, payload))
+            with self.assertRaises(LssException):
+                bad.read()
+        bad.close()
+
+        received = []
+        self.bus.add_listener(received.append)
+        client = LssClient(self.daemon.path)
+        client.write_commands([(4, 'QD'), (1, 'QD')])
+        self.assertEqual(client.read_raw(), b'*4QD12ab')
+        self.assertEqual(client.read().id, 1)
+        client.close()
+        # listeners run on the bus thread after the reply went out
+        for _ in range(100):
+            if received:
+                break
+            time.sleep(0.01)
+        self.assertEqual([p.id for p in received], [1])
+
+
+    def test_replies_match_servo_and_command(self):
+        class Recorder(object):
+            def __init__(self):
+                self.messages = []
+
+            def send(self, kind: int, bus: int, payload: bytes = b''):
+                self.messages.append((kind, payload))
+
+        # two clients in one batch, servo 1 does not answer the first query
+        first, second = Recorder(), Recorder()
+        self.daemon._write_batch(0, [(first, MSG_WRITE, b'#1QTQX'), (second, MSG_WRITE, b'#1QV'),
+                                     (first, MSG_WRITE, b'#2QDT'), (second, MSG_WRITE, b'#2QD')])
+        self.assertEqual(first.messages, [(MSG_TIMEOUT, b''), (MSG_REPLY, b'*2QDT0')])
+        self.assertEqual(second.messages, [(MSG_REPLY, b'*1QV11900'), (MSG_REPLY, b'*2QD0')])
+
+        client = LssClient(self.daemon.path)
+        client.write_commands([(1, 'QTQX'), (1, 'QV')])
+        with self.assertRaises(TimeoutError):
+            client.read()
+        self.assertEqual(client.read().value, 11900)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import math
+import unittest
+
+import numpy as np
+
+from lss import LssBus, LssPacket, LssException
+from lss.emulator import LssEmulator, LssEmulatedServo
+from lss.history import LssRingBuffer, LssTelemetryHistory
+
+
+class LssHistoryTests(unittest.TestCase):
+    def test_ring_wraps(self):
+        ring = LssRingBuffer(5)
+        for i in range(12):
+            ring.append(float(i), i * 10)
+        self.assertEqual(len(ring), 5)
+        times, values = ring.window()
+        self.assertEqual(times.tolist(), [7.0, 8.0, 9.0, 10.0, 11.0])
+        self.assertEqual(values.tolist(), [70, 80, 90, 100, 110])
+        self.assertEqual(ring.last(), (11.0, 110.0))
+
+    def test_window_across_wrap(self):
+        ring = LssRingBuffer(8)
+        for i in range(13):
+            ring.append(i * 0.5, i)
+        times, values = ring.window(3.0, 5.0)
+        self.assertEqual(values.tolist(), [6, 7, 8, 9, 10])
+        self.assertEqual(ring.window(100.0)[0].size, 0)
+
+    def test_stats(self):
+        ring = LssRingBuffer(100)
+        samples = [3, -1, 4, 1, -5, 9, 2, 6]
+        for i, value in enumerate(samples):
+            ring.append(float(i), value)
+        stats = ring.stats(1.0, 6.0)
+        window = samples[1:7]
+        self.assertEqual(stats.count, 6)
+        self.assertEqual((stats.min, stats.max), (-5, 9))
+        self.assertAlmostEqual(stats.mean, sum(window) / 6)
+        self.assertAlmostEqual(stats.percentiles[90], np.percentile(window, 90))
+        self.assertTrue(math.isnan(ring.stats(50.0).mean))
+
+    def test_downsample(self):
+        ring = LssRingBuffer(1000)
+        for i in range(100):
+            ring.append(i * 0.01, i)
+        down = ring.downsample(0.25)
+        self.assertEqual(len(down), 4)
+        self.assertEqual(down.count.tolist(), [25, 25, 25, 25])
+        self.assertEqual(down.min.tolist(), [0, 25, 50, 75])
+        self.assertEqual(down.max.tolist(), [24, 49, 74, 99])
+        self.assertAlmostEqual(down.mean[0], 12.0)
+        with self.assertRaises(LssException):
+            ring.downsample(0)
+
+    def test_memory_is_bounded(self):
+        history = LssTelemetryHistory(capacity=100, servos=[1, 2], parameters=['D', 'C'])
+        allocated = history.nbytes
+        self.assertEqual(allocated, 4 * 100 * 16)
+        for i in range(10000):
+            history.record(LssPacket(f'*{1 + i % 3}QD{i}'), t=float(i))
+        self.assertEqual(history.nbytes, allocated)
+        self.assertEqual(history.streams(), [(1, 'D'), (2, 'D')])
+        self.assertEqual(history.last(1, 'D'), (9999.0, 9999.0))
+
+    def test_auto_allocation_is_bounded(self):
+        history = LssTelemetryHistory(capacity=10, max_streams=3)
+        history.record(LssPacket('*1QXYZ5'), t=0.0)
+        for servo in range(1, 6):
+            history.record(LssPacket(f'*{servo}QD{servo}'), t=1.0)
+        self.assertEqual(history.streams(), [(1, 'D'), (2, 'D'), (3, 'D')])
+        self.assertEqual(history.nbytes, 3 * 10 * 16)
+        self.assertEqual(history.skipped, 3)
+        explicit = LssTelemetryHistory(capacity=10, parameters=['XYZ'])
+        explicit.record(LssPacket('*1QXYZ5'), t=0.0)
+        self.assertEqual(explicit.last(1, 'XYZ'), (0.0, 5.0))
+
+    def test_records_bus_replies(self):
+        now = [0.0]
+        with LssEmulator([LssEmulatedServo(1, C=150), LssEmulatedServo(2)]) as emulator:
+            bus = LssBus(emulator.port, 115200, low_latency=False)
+            history = LssTelemetryHistory(bus, capacity=50, clock=lambda: now[0])
+            for i in range(60):
+                now[0] = i * 0.1
+                bus.write_commands([(1, 'QC'), (2, 'QD'), (1, 'QMS')])
+                for _ in range(3):
+                    bus.read()
+            history.close()
+            bus.close()
+        self.assertEqual(sorted(history.streams()), [(1, 'C'), (2, 'D')])
+        stats = history.recent(1, 'C', 1.0)
+        self.assertEqual((stats.count, stats.mean), (11, 150.0))
+        self.assertEqual(len(history.buffer(2, 'D')), 50)
+        with self.assertRaises(LssException):
+            history.buffer(3, 'D')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from lss import LssBus, LssException
+from lss.emulator import LssEmulator
+from lss.latency import LssLatencyTuner, discover_adapter
+
+
+class LssLatencyTests(unittest.TestCase):
+    def make_sysfs(self, root: str):
+        # /sys/class/tty/ttyUSB0/device -> /sys/devices/usb1/1-1/1-1:1.0/ttyUSB0 like an FTDI adapter
+        usb = os.path.join(root, 'devices', 'usb1', '1-1')
+        port = os.path.join(usb, '1-1:1.0', 'ttyUSB0')
+        driver = os.path.join(root, 'bus', 'usb-serial', 'drivers', 'ftdi_sio')
+        os.makedirs(port)
+        os.makedirs(driver)
+        os.makedirs(os.path.join(root, 'class', 'tty', 'ttyUSB0'))
+        os.symlink(port, os.path.join(root, 'class', 'tty', 'ttyUSB0', 'device'))
+        os.symlink(driver, os.path.join(port, 'driver'))
+        for path, value in ((os.path.join(usb, 'idVendor'), '0403'),
+                            (os.path.join(usb, 'idProduct'), '6001'),
+                            (os.path.join(port, 'latency_timer'), '16')):
+            with open(path, 'w') as f:
+                f.write(value + '\n')
+
+    def test_discover(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.make_sysfs(root)
+            adapter = discover_adapter('/dev/ttyUSB0', root)
+            self.assertEqual(adapter.driver, 'ftdi_sio')
+            self.assertEqual((adapter.vendor, adapter.product), ('0403', '6001'))
+            self.assertTrue(adapter.latency_timer.endswith('latency_timer'))
+            self.assertIsNone(discover_adapter('/dev/ttyS9', root).device)
+
+    def test_apply_and_restore(self):
+        with tempfile.TemporaryDirectory() as root, LssEmulator([1]) as emulator:
+            self.make_sysfs(root)
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            tuner = LssLatencyTuner(bus, '/dev/ttyUSB0', root)
+            original = tuner.report()
+            self.assertEqual(original['latency_timer'], 16)
+            self.assertEqual(original['usb_id'], '0403:6001')
+
+            tuner.set_read_parameters(1, 5)
+            before, after = tuner.tune(servo=1, count=5, vmin=0, vtime=0)
+            self.assertGreater(before, 0)
+            self.assertGreater(after, 0)
+            self.assertEqual(tuner.report()['latency_timer'], 1)
+            self.assertEqual(tuner.get_read_parameters(), (0, 0))
+
+            tuner.restore()
+            self.assertEqual(tuner.report()['latency_timer'], 16)
+            self.assertEqual(tuner.get_read_parameters(), (1, 5))
+            bus.close()
+
+    def test_restore_skips_what_apply_could_not_set(self):
+        with tempfile.TemporaryDirectory() as root, LssEmulator([1]) as emulator:
+            self.make_sysfs(root)
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            tuner = LssLatencyTuner(bus, '/dev/ttyUSB0', root)
+
+            def denied(ms):
+                # like writing the latency timer without root or a udev rule
+                raise LssException(f'Failed to set latency timer to {ms}ms: permission denied')
+            tuner.set_latency_timer = denied
+            tuner.set_read_parameters(1, 5)
+            tuner.apply(vmin=0, vtime=0, ignore_error=True)
+            self.assertIsNone(tuner.saved_latency_timer)
+            self.assertEqual(tuner.get_read_parameters(), (0, 0))
+            tuner.restore()
+            self.assertEqual(tuner.get_latency_timer(), 16)
+            self.assertEqual(tuner.get_read_parameters(), (1, 5))
+            bus.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
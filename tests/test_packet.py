@@ -0,0 +1,55 @@
+import math
+import unittest
+
+from lss import LssPacket, REQUEST, REPLY, ACTION, QUERY, CONFIG
+
+
+class LssPacketTests(unittest.TestCase):
+    def assert_packet(self, p: LssPacket):
+        self.assertIsNotNone(p)
+        self.assertGreater(p.id, 0)
+        self.assertLess(p.id, 50)
+        self.assertIn(p.direction, [REQUEST, REPLY])
+        self.assertIn(p.kind, [ACTION, QUERY, CONFIG])
+        self.assertTrue(p.known)
+
+    def test_command_position(self):
+        self.assert_packet(LssPacket('#12D521'))
+
+    def test_reply_model(self):
+        p = LssPacket('*12QMSLSS-HT1')
+        self.assert_packet(p)
+        self.assertEqual(p.value, 'LSS-HT1')
+
+    def test_reply_position(self):
+        p = LssPacket('*12QD980')
+        self.assert_packet(p)
+        self.assertEqual(p.value, 980)
+
+    def test_reply_neg_position(self):
+        p = LssPacket('*19QD-1190')
+        self.assert_packet(p)
+        self.assertEqual(p.value, -1190)
+
+    def test_reply_QS0(self):
+        p = LssPacket('*19QS900')
+        self.assert_packet(p)
+        self.assertEqual(p.value, 900)
+
+    def test_command_modifiers(self):
+        p = LssPacket('#3D-900T1500')
+        self.assert_packet(p)
+        self.assertEqual(p.value, -900)
+        self.assertEqual(p.modifiers, {'T': 1500})
+        self.assertEqual(LssPacket('#3MD450SD200').modifiers, {'SD': 200})
+        self.assertIsNone(LssPacket('#3D450X2').value)
+
+    def test_si_value(self):
+        self.assertAlmostEqual(LssPacket('*12QD-900').si_value, -math.pi / 2)
+        self.assertAlmostEqual(LssPacket('*12QV11800').si_value, 11.8)
+        self.assertEqual(LssPacket('*12QV11800').unit.unit, 'V')
+        self.assertIsNone(LssPacket('*12QMSLSS-HT1').si_value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import math
+import unittest
+
+from lss import LssBus, LssPacket
+from lss.emulator import LssEmulator
+from lss.predictor import LssMovePlan, LssServoEstimator, LssAdaptivePoller
+
+
+class LssPredictorTests(unittest.TestCase):
+    def test_trapezoid(self):
+        plan = LssMovePlan(0, 1000, 0.0, speed=1000, acceleration=2000, deceleration=2000)
+        self.assertAlmostEqual(plan.t_end, 1.5)
+        self.assertEqual(plan.at(0.5), (250.0, 1000.0))
+        self.assertAlmostEqual(plan.at(1.0)[0], 750.0)
+        self.assertEqual(plan.at(2.0), (1000, 0.0))
+        short = LssMovePlan(0, -100, 0.0, speed=1000, acceleration=2000, deceleration=2000)
+        self.assertAlmostEqual(short.at(short.t_end / 2)[0], -50.0)
+
+    def test_timed_move(self):
+        estimator = LssServoEstimator(1)
+        estimator.measure(LssPacket('*1QD0'), 0.0)
+        estimator.command(LssPacket('#1D900T1500'), 0.0)
+        self.assertAlmostEqual(estimator.predict(0.5)[0], 300.0)
+        self.assertAlmostEqual(estimator.predict(0.5)[1], 600.0)
+
+    def test_measurement_corrects_prediction(self):
+        estimator = LssServoEstimator(1)
+        self.assertEqual(estimator.uncertainty(0.0), math.inf)
+        estimator.measure(LssPacket('*1QD100'), 0.0)
+        estimator.command(LssPacket('#1D500'), 1.0)
+        estimator.measure(LssPacket('*1QD480'), 5.0)
+        # servo stopped short of the target
+        self.assertAlmostEqual(estimator.predict(6.0)[0], 480.0)
+        self.assertLess(estimator.uncertainty(5.0), estimator.uncertainty(6.0))
+
+    def test_speed_reply_raises_uncertainty(self):
+        estimator = LssServoEstimator(1)
+        estimator.measure(LssPacket('*1QD0'), 0.0)
+        estimator.command(LssPacket('#1D900T1500'), 0.0)
+        estimator.measure(LssPacket('*1QS600'), 0.5)
+        agreeing = estimator.uncertainty(0.7)
+        # the servo reports standing still while the model has it moving at 600
+        estimator.measure(LssPacket('*1QS0'), 0.5)
+        self.assertAlmostEqual(estimator.uncertainty(0.7) - agreeing, 600 * 0.2)
+        estimator.measure(LssPacket('*1QD300'), 0.7)
+        self.assertAlmostEqual(estimator.uncertainty(0.7), estimator.measurement_noise)
+        estimator.command(LssPacket('#1D0'), 0.7)
+        self.assertEqual(estimator.velocity_error, 0.0)
+
+    def test_poll_only_when_uncertain(self):
+        now = [0.0]
+        with LssEmulator([1, 2]) as emulator:
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            poller = LssAdaptivePoller(bus, [1, 2], clock=lambda: now[0])
+            self.assertEqual(poller.poll(), [1, 2])
+            now[0] = 0.1
+            self.assertEqual(poller.poll(), [])
+            poller.write_command(2, 'D900')
+            now[0] = 0.6
+            self.assertEqual(poller.poll(), [2])
+            self.assertEqual(poller.predict(2)[0], 900.0)
+            now[0] = 5.0
+            self.assertEqual(poller.poll(), [1, 2])
+            self.assertEqual((poller.queries, poller.skipped), (5, 3))
+            poller.close()
+            bus.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
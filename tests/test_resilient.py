@@ -0,0 +1,151 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from lss import LssException
+from lss.emulator import LssEmulator, LssEmulatedServo
+from lss.resilient import LssResilientBus, LssBusIncident
+
+
+class LssDroppingPort(object):
+    # a port that is lost again on the first write
+    def __init__(self, port):
+        self.port = port
+
+    def write(self, data: bytes):
+        raise OSError('device disconnected')
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+
+class LssFlakyResilientBus(LssResilientBus):
+    drop_next_port = False
+
+    def open_port(self):
+        port = super().open_port()
+        if self.drop_next_port:
+            self.drop_next_port = False
+            return LssDroppingPort(port)
+        return port
+
+
+class LssResilientBusTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.link = os.path.join(self.directory.name, 'ttyLSS')
+        self.servo = LssEmulatedServo(1, D=450)
+        self.emulator = LssEmulator([self.servo, LssEmulatedServo(2)], link=self.link)
+        self.emulator.start()
+
+    def tearDown(self):
+        self.emulator.stop()
+        self.directory.cleanup()
+
+    def yank(self, downtime: float):
+        # unplugs the emulated adapter and plugs it back in after downtime
+        self.emulator.stop()
+
+        def replug():
+            time.sleep(downtime)
+            self.emulator.start()
+        thread = threading.Thread(target=replug)
+        thread.start()
+        return thread
+
+    def test_survives_port_loss(self):
+        bus = LssResilientBus(self.link, 115200, low_latency=False, timeout=0.5)
+        bus.write_commands([(1, 'QMS'), (2, 'QF')])
+        self.assertEqual([bus.read().value, bus.read().value], ['LSS-ST1', 368])
+        bus.ser.timeout = 0.25
+        received = []
+        bus.add_listener(received.append)
+
+        replug = self.yank(0.2)
+        bus.write_command(1, 'QD')
+        self.assertEqual(bus.read().value, 450)
+        bus.write_command(1, 'D900')
+        bus.write_command(1, 'QD')
+        self.assertEqual(bus.read().value, 900)
+        replug.join()
+
+        self.assertEqual(len(bus.incidents), 1)
+        incident = bus.incidents[0]
+        self.assertIsInstance(incident, LssBusIncident)
+        self.assertGreater(incident.attempts, 1)
+        self.assertGreaterEqual(incident.downtime, 0.15)
+        self.assertLess(incident.downtime, 2.0)
+        self.assertEqual(bus.downtime, incident.downtime)
+        self.assertEqual(bus.ser.timeout, 0.25)
+        self.assertEqual(len(received), 2)
+        self.assertEqual(bus.known_servos(), {1: {'MS': 'LSS-ST1'}, 2: {'F': 368}})
+        self.assertEqual(len(bus.in_flight), 0)
+        bus.close()
+
+    def test_replays_queries_in_flight(self):
+        bus = LssResilientBus(self.link, 115200, low_latency=False, timeout=0.5)
+        hooks = []
+        bus.add_reconnect_hook(hooks.append)
+        # the query reaches the port but the adapter goes away before the reply
+        self.emulator.running = False
+        self.emulator.thread.join()
+        bus.write_commands([(1, 'QD'), (2, 'QD')])
+        replug = self.yank(0.05)
+        self.assertEqual([bus.read().id, bus.read().id], [1, 2])
+        replug.join()
+        self.assertEqual(bus.incidents[0].replayed, 2)
+        self.assertEqual(hooks, [bus])
+        bus.close()
+
+    def test_port_lost_again_during_replay(self):
+        bus = LssFlakyResilientBus(self.link, 115200, low_latency=False, timeout=0.5)
+        self.emulator.running = False
+        self.emulator.thread.join()
+        bus.write_commands([(1, 'QD'), (2, 'QD')])
+        bus.drop_next_port = True
+        replug = self.yank(0.05)
+        self.assertEqual([bus.read().id, bus.read().id], [1, 2])
+        replug.join()
+        self.assertEqual(len(bus.incidents), 1)
+        self.assertEqual(bus.incidents[0].replayed, 2)
+        self.assertFalse(bus.drop_next_port)
+        bus.close()
+
+    def test_replies_match_whole_commands(self):
+        bus = LssResilientBus(self.link, 115200, low_latency=False, timeout=0.5)
+        bus.in_flight.extend([(1, 'D', b'#1QD'), (1, 'DT', b'#1QDT'), (1, 'MS', b'#1QMS')])
+        bus.answered(b'*1QDT450')
+        self.assertEqual([command for _, command, _ in bus.in_flight], ['D', 'MS'])
+        bus.answered(b'*1QMSLSS-ST1')
+        self.assertEqual([command for _, command, _ in bus.in_flight], ['D'])
+        self.assertEqual(bus.known_servos(), {1: {'MS': 'LSS-ST1'}})
+        bus.close()
+
+    def test_failed_write_drops_relative_moves(self):
+        bus = LssResilientBus(self.link, 115200, low_latency=False, timeout=0.5)
+        self.emulator.stop()
+        replug = threading.Timer(0.05, self.emulator.start)
+        replug.start()
+        bus.write_commands([(1, 'MD100'), (1, 'D900'), (1, 'QD')])
+        self.assertEqual(bus.read().value, 900)
+        replug.join()
+        self.assertEqual(bus.incidents[0].dropped, 1)
+        bus.close()
+
+    def test_gives_up(self):
+        bus = LssResilientBus(self.link, 115200, low_latency=False, timeout=0.5, reconnect_timeout=0.1)
+        self.emulator.stop()
+        with self.assertRaises(LssException):
+            bus.write_command(1, 'QD')
+        self.assertIsNone(bus.incidents[0].downtime)
+        self.emulator.start()
+        bus.write_command(1, 'QD')
+        self.assertEqual(bus.read().value, 450)
+        self.assertEqual(len(bus.incidents), 2)
+        bus.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from lss import LssPacket, LssException
+from lss.shared import LssSharedTelemetry, seq_struct
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _read_in_child(name: str, servo: int, queue):
+    telemetry = LssSharedTelemetry.attach(name)
+    state = telemetry.read(servo)
+    queue.put((state.sequence, state.position, state.voltage))
+    telemetry.close()
+
+
+class LssSharedTelemetryTests(unittest.TestCase):
+    def setUp(self):
+        self.name = f'lss-test-{time.time_ns()}'
+        self.telemetry = LssSharedTelemetry.create(self.name, [1, 2])
+
+    def tearDown(self):
+        self.telemetry.close()
+
+    def test_publish_replies(self):
+        self.telemetry.publish(LssPacket('*2QD-450'))
+        self.telemetry.publish(LssPacket('*2QV11800'))
+        self.telemetry.publish(LssPacket('*2QMSLSS-HT1'))
+        self.telemetry.publish(LssPacket('#2D900'))
+        state = self.telemetry.read(2)
+        self.assertEqual(state.id, 2)
+        self.assertEqual(state.position, -450)
+        self.assertEqual(state.voltage, 11800)
+        self.assertEqual(state.sequence, 2)
+        self.assertEqual(self.telemetry.read(1).sequence, 0)
+
+    def test_torn_slot_is_retried(self):
+        offset = self.telemetry.slots[1]
+        # writer stuck half way through an update
+        seq_struct.pack_into(self.telemetry.buf, offset, 1)
+        with self.assertRaises(LssException):
+            self.telemetry.read(1)
+
+    def test_read_from_other_process(self):
+        self.telemetry.update(1, 'D', 1234)
+        self.telemetry.update(1, 'V', 11100)
+        queue = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_read_in_child, args=(self.name, 1, queue))
+        child.start()
+        self.assertEqual(queue.get(timeout=10), (2, 1234, 11100))
+        child.join()
+
+
+    def test_values_out_of_range_are_ignored(self):
+        self.telemetry.update(1, 'V', 11800)
+        self.assertFalse(self.telemetry.update(1, 'V', 2 ** 31))
+        self.telemetry.publish(LssPacket('*1QV99999999999'))
+        self.assertEqual(self.telemetry.read(1).voltage, 11800)
+
+    def run_python(self, code: str):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        return subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, capture_output=True, text=True,
+                              timeout=30)
+
+    def test_readers_leave_the_segment_to_the_owner(self):
+        # a reader with a resource tracker of its own must not unlink the segment
+        self.telemetry.update(2, 'D', 77)
+        reader = self.run_python(f'''
+from lss.shared import LssSharedTelemetry
+telemetry = LssSharedTelemetry.attach({self.name!r})
+print(telemetry.read(2).position)
+telemetry.close()
+''')
+        self.assertEqual(reader.stdout.strip(), '77', reader.stderr)
+        self.assertEqual(LssSharedTelemetry.attach(self.name).read(2).position, 77)
+
+        # a reader sharing the owner's tracker must not unregister the owner's segment
+        owner = self.run_python(f'''
+import multiprocessing
+from lss.shared import LssSharedTelemetry
+from tests.test_shared import _read_in_child
+if __name__ == '__main__':
+    telemetry = LssSharedTelemetry.create({self.name + '-owner'!r}, [1])
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_read_in_child, args=({self.name + '-owner'!r}, 1, queue))
+    child.start()
+    print(queue.get(timeout=10))
+    child.join()
+    telemetry.close()
+''')
+        self.assertEqual(owner.stdout.strip(), '(0, 0, 0)', owner.stderr)
+        self.assertNotIn('Traceback', owner.stderr)
+        self.assertNotIn('leaked', owner.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+
+from lss import LssBus
+from lss.emulator import LssEmulator
+from lss.stream import LssTrajectoryStream
+
+
+class LssTrajectoryStreamTests(unittest.TestCase):
+    class RecordingBus(object):
+        eol = b'\r'
+
+        def __init__(self):
+            self.writes = []
+
+        def write_raw(self, data: bytes):
+            self.writes.append(data)
+
+    def test_prepare(self):
+        stream = LssTrajectoryStream(self.RecordingBus(), [1, 2], rate=10, lower=[-100, -900], upper=900)
+        positions = stream.prepare([0.0, 1.0], [[0, 0], [1000, -1000]])
+        self.assertEqual(stream.ticks, 11)
+        self.assertEqual(positions[5].tolist(), [500, -500])
+        self.assertEqual(positions[-1].tolist(), [900, -900])
+        self.assertEqual(stream.buffer[stream.offsets[1]:stream.offsets[2]], b'#1D100\r#2D-100\r')
+
+    def test_speed_cap(self):
+        stream = LssTrajectoryStream(self.RecordingBus(), [1], rate=10, max_speed=1000)
+        positions = stream.prepare([0.0, 0.1, 1.0], [[0], [500], [500]])
+        # 100 per tick at most, reaches the target late instead of skipping ahead
+        self.assertEqual(positions[:7, 0].tolist(), [0, 100, 200, 300, 400, 500, 500])
+
+    def test_speed_cap_matches_per_tick_limit(self):
+        rng = np.random.default_rng(3)
+        trajectory = np.column_stack([np.cumsum(rng.normal(0, 40, 500)), rng.normal(0, 300, 500),
+                                      np.sin(np.linspace(0, 10, 500)) * 900])
+        stream = LssTrajectoryStream(self.RecordingBus(), [1, 2, 3], rate=100, max_speed=[3000, 0, 5000])
+        limited = stream.limit(trajectory)
+        # the same cap one tick at a time
+        step = stream.max_speed / stream.rate
+        expected = trajectory.copy()
+        for n in range(1, len(expected)):
+            expected[n] = expected[n - 1] + np.clip(trajectory[n] - expected[n - 1], -step, step)
+        np.testing.assert_allclose(limited, expected, atol=1e-6)
+        self.assertTrue(np.all(limited[:, 1] == trajectory[0, 1]))
+
+    def test_late_ticks_are_dropped(self):
+        bus = self.RecordingBus()
+        stream = LssTrajectoryStream(bus, [1], rate=100)
+        stream.prepare([0.0, 0.05], [[0], [50]])
+        now = [0.0]
+
+        def clock():
+            return now[0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        def stall(data):
+            bus.writes.append(data)
+            if len(bus.writes) == 2:
+                # writing the second tick takes 3.5 periods
+                now[0] += 0.035
+
+        bus.write_raw = stall
+        report = stream.play(clock, sleep)
+        self.assertEqual((report.ticks, report.sent, report.dropped), (6, 4, 2))
+        self.assertEqual(bus.writes[-1], b'#1D50\r')
+
+    def test_stream_to_emulated_bus(self):
+        with LssEmulator([1, 2, 3]) as emulator:
+            bus = LssBus(emulator.port, 921600, low_latency=False)
+            stream = LssTrajectoryStream(bus, [1, 2, 3], rate=200)
+            t = np.linspace(0, 0.25, 6)
+            stream.prepare(t, np.stack([t * 1000, -t * 1000, np.full_like(t, 30)], axis=1))
+            report = stream.play()
+            self.assertEqual(report.sent + report.dropped, report.ticks)
+            bus.write_commands([(servo, 'QD') for servo in (1, 2, 3)])
+            self.assertEqual([bus.read().value for _ in range(3)], [250, -250, 30])
+            bus.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
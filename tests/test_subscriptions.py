@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from lss import LssBus, LssPacket
+from lss.emulator import LssEmulator, LssEmulatedServo
+from lss.subscriptions import LssLatestQueue, LssSubscriptions
+
+
+class LssNoPort(object):
+    def write(self, data: bytes):
+        return len(data)
+
+    def read(self, size: int = 1):
+        return b''
+
+    def close(self):
+        pass
+
+
+class LssLostPort(LssNoPort):
+    def read(self, size: int = 1):
+        raise OSError('device disconnected')
+
+
+class LssSubscriptionTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.bus = LssBus(LssNoPort(), 115200, low_latency=False)
+        self.hub = LssSubscriptions(self.bus, clock=lambda: self.now)
+
+    def feed(self, *frames, step: float = 0.01):
+        start = self.now
+        for i, frame in enumerate(frames):
+            self.now = start + i * step
+            self.hub.dispatch(LssPacket(frame))
+        self.now = start + len(frames) * step
+
+    def test_deadband(self):
+        seen = []
+        self.hub.subscribe(1, 'D', callback=lambda update: seen.append(update.value), deadband=5)
+        self.feed('*1QD100', '*1QD103', '*1QD105', '*1QD106', '*1QD100', '*2QD500', '*1QC100')
+        self.assertEqual(seen, [100, 106, 100])
+
+    def test_min_interval(self):
+        subscription = self.hub.subscribe(1, 'D', min_interval=0.045, maxsize=10)
+        self.feed(*[f'*1QD{i}' for i in range(20)])
+        values = [subscription.get_nowait().value for _ in range(len(subscription.queue))]
+        self.assertEqual(values, [0, 5, 10, 15])
+        self.assertEqual(subscription.filtered, 16)
+
+    def test_wildcard_and_strings(self):
+        models = self.hub.subscribe(None, 'MS', maxsize=10)
+        self.feed('*1QMSLSS-ST1', '*2QMSLSS-HS1', '*1QMSLSS-ST1')
+        self.assertEqual([(u.servo, u.value) for u in (models.get_nowait(), models.get_nowait())],
+                         [(1, 'LSS-ST1'), (2, 'LSS-HS1')])
+        self.assertIsNone(models.get_nowait())
+
+    def test_latest_value_wins(self):
+        subscription = self.hub.subscribe(1, 'D', maxsize=2)
+        self.feed(*[f'*1QD{i}' for i in range(5)])
+        self.assertEqual(subscription.dropped, 3)
+        self.assertEqual([subscription.get().value, subscription.get().value], [3, 4])
+        self.assertIsNone(subscription.get(timeout=0.01))
+        subscription.close()
+        with self.assertRaises(EOFError):
+            subscription.get()
+
+    def test_async_iteration(self):
+        queue = LssLatestQueue(maxsize=100)
+
+        def produce():
+            for i in range(5):
+                time.sleep(0.002)
+                queue.put(i)
+            queue.close()
+
+        async def consume():
+            threading.Thread(target=produce).start()
+            return [item async for item in queue]
+
+        self.assertEqual(asyncio.run(consume()), [0, 1, 2, 3, 4])
+
+    def test_push_from_bus(self):
+        servo = LssEmulatedServo(1, D=0, C=120)
+        with LssEmulator([servo]) as emulator:
+            bus = LssBus(emulator.port, 115200, low_latency=False)
+            with LssSubscriptions(bus) as hub:
+                position = hub.subscribe(1, 'D', deadband=2)
+                currents = []
+                hub.subscribe(1, 'C', callback=currents.append, deadband=10)
+                hub.start([(1, 'QD'), (1, 'QC')], rate=500)
+                self.assertEqual(position.get(timeout=1).value, 0)
+                servo.registers['D'] = 1
+                time.sleep(0.05)
+                servo.registers['D'] = 900
+                self.assertEqual(position.get(timeout=1).value, 900)
+                hub.stop()
+                self.assertGreater(hub.cycles, 10)
+                self.assertEqual(position.delivered, 2)
+                self.assertEqual([update.value for update in currents], [120])
+            bus.close()
+
+
+    def test_failing_callback(self):
+        def fail(update):
+            raise ValueError('subscriber bug')
+
+        failing = self.hub.subscribe(1, 'D', callback=fail)
+        other = self.hub.subscribe(1, 'D', maxsize=10)
+        self.feed('*1QD100', '*1QD200')
+        self.assertEqual((failing.errors, type(failing.error)), (2, ValueError))
+        self.assertEqual(len(other.queue), 2)
+
+    def test_poller_survives_garbled_replies(self):
+        with LssEmulator([LssEmulatedServo(1, D=0), LssEmulatedServo(2, D='12ab')]) as emulator:
+            bus = LssBus(emulator.port, 115200, low_latency=False)
+            with LssSubscriptions(bus) as hub:
+                position = hub.subscribe(1, 'D', maxsize=10)
+                hub.start([(2, 'QD'), (1, 'QD')], rate=500)
+                self.assertEqual(position.get(timeout=1).value, 0)
+                time.sleep(0.05)
+                self.assertTrue(hub.running)
+                self.assertIsNone(hub.error)
+                hub.stop()
+                self.assertGreater(hub.garbled, 1)
+            bus.close()
+
+    def test_poller_failure_closes_queues(self):
+        bus = LssBus(LssLostPort(), 115200, low_latency=False)
+        hub = LssSubscriptions(bus)
+        position = hub.subscribe(1, 'D')
+        hub.start([(1, 'QD')], rate=100)
+        with self.assertRaises(EOFError):
+            position.get(timeout=1)
+        hub.thread.join(1)
+        self.assertFalse(hub.running)
+        self.assertIsInstance(hub.error, OSError)
+        hub.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
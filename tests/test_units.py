@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+from lss import LssPacket, LssException, LssCommandUnits
+from lss.units import to_si, from_si, valid, mixed_to_si, packets_to_si
+
+
+class LssUnitsTests(unittest.TestCase):
+    def test_to_si(self):
+        np.testing.assert_allclose(to_si('D', [0, 900, -1800]), [0, np.pi / 2, -np.pi])
+        np.testing.assert_allclose(to_si('WR', [60]), [2 * np.pi])
+        with self.assertRaises(LssException):
+            to_si('MS', [1])
+
+    def test_from_si(self):
+        self.assertEqual(from_si('V', [11.8, 20.0]).tolist(), [11800, 14000])
+        self.assertEqual(from_si('D', [np.pi / 4]).tolist(), [450])
+
+    def test_valid(self):
+        self.assertEqual(valid('AA', [0, 1, 100, 101]).tolist(), [False, True, True, False])
+
+    def test_mixed(self):
+        np.testing.assert_allclose(mixed_to_si(['V', 'C', 'LED'], [12000, 250, 3]), [12.0, 0.25, 3])
+        si = packets_to_si([LssPacket('*1QV11000'), LssPacket('*1QMSLSS-ST1'), LssPacket('*1QT350')])
+        np.testing.assert_allclose(si, [11.0, np.nan, 308.15])
+
+    def test_temperature_in_kelvin(self):
+        np.testing.assert_allclose(to_si('T', [0, 350, -400]), [273.15, 308.15, 233.15])
+        self.assertEqual(from_si('T', [308.15, 0.0]).tolist(), [350, -400])
+        self.assertAlmostEqual(LssPacket('*1QT350').si_value, 308.15)
+        self.assertEqual(LssCommandUnits['T'].from_si(LssCommandUnits['T'].to_si(-12)), -12)
+
+
+if __name__ == '__main__':
+    unittest.main()